@@ -1,5 +1,5 @@
-import sys
 import time
+import argparse
 import pyglet
 import numpy as np
 
@@ -7,13 +7,28 @@ from pyglet.window import key # controller
 
 import utils
 import game_tools as gt
+from solar_system import StudentSolarSystem
 from screen_transform import ScreenTransform
+from collisions import merge_overlaps
+from renderer import BodyRenderer
+from atlas import Atlas, load_background
+from profiler import FrameProfiler
+from recording import Recorder, Recording, inputs_mask
+from simulation import Simulation, THRUST, FLOW_RATE, EAT_DISTANCE, DRY_MASS, DM
 
 SYSTEM_SIZE = 30 # AU
 
 WIDTH = 1920 # width
 HEIGHT = 1080 # height
 game_name = 'Asteroid Rage' # take game name from file name
+
+parser = argparse.ArgumentParser(description = game_name)
+parser.add_argument('--record', default = None, help = 'record the session to this file')
+parser.add_argument('--record-minutes', type = float, default = 10, help = 'expected session length, the recording grows if it runs longer')
+parser.add_argument('--replay', default = None, help = 'replay a recorded session instead of playing')
+parser.add_argument('--speed', type = float, default = 1, help = 'replay speed [physics steps per frame]')
+args = parser.parse_args()
+
 window = pyglet.window.Window(WIDTH, HEIGHT, caption = game_name)
 
 controller = key.KeyStateHandler() # create a controller
@@ -21,19 +36,45 @@ window.push_handlers(controller) # connect controller to game window
 
 n_planets = 7 # number of planets
 n_bodies = 2 + n_planets # 1 sun, 1 player
+N_PLANET_IMAGES = 7 # graphics/p1.png ... p7.png
+GRAVITY = 'direct' # gravity backend, use 'barnes_hut' for large asteroid fields
+N_DEBRIS = 1000 # massless test particles: asteroids and dust
+HYBRID = False # Kepler orbits for unperturbed planets; only pays off with tiny perturbers
+INTEGRATOR = 'leapfrog' # see integrators.INTEGRATORS
+FPS = 120 # updates per second
+FRAME_DT = 1/100 # simulation time per frame at the start [yr], changed with , and .
+# keys recorded as player inputs, in the order of recording.INPUTS
+INPUT_KEYS = [key.W, key.A, key.D, key.SPACE, key.UP, key.DOWN, key.COMMA, key.PERIOD]
+
+# a replay draws the bodies of a recorded session, nothing is simulated
+recording = Recording(args.replay) if args.replay else None
+if recording:
+    # the system must be the size of the recorded one, e.g. simulation.py --bodies 20
+    n_bodies = recording.capacity
+    N_DEBRIS = recording.n_particles
 
 # transform object to convert from solar system to screen coordinates
 transform = ScreenTransform(WIDTH, HEIGHT, SYSTEM_SIZE, 1)
 # create a solar system which does calculations
-sol = gt.StudentSolarSystem(n_bodies, SYSTEM_SIZE)
+sol = StudentSolarSystem(n_bodies, SYSTEM_SIZE, gravity = GRAVITY, n_particles = N_DEBRIS,
+                        hybrid = HYBRID, integrator = INTEGRATOR)
+profiler = FrameProfiler() # per-stage timings, shown with P, saved with O
+sim = Simulation(sol, profiler = profiler) # physics runs at a fixed step, rendering interpolates
+if recording:
+    recording.load(0, sol)
+elif args.record:
+    # one record per physics step, FRAME_DT/sim.dt of them per frame
+    sim.recorder = Recorder(args.record, sol, int(args.record_minutes*60*FPS*FRAME_DT/sim.dt), sim.dt)
 
-# Load icons for solar system objects and player
-background_img  = gt.load_sprite_image('./graphics/background.png')
-player_icon = gt.load_sprite_image('./graphics/player.png')
-player_eat_icon = gt.load_sprite_image('./graphics/player_consume.png')
-star_icon = gt.load_sprite_image('./graphics/star.png')
+# Load icons for solar system objects and player, all from one (cached) texture atlas
+atlas = Atlas('./graphics')
+# the background is too large for the atlas, its decoded (downscaled) pixels are cached next to it
+background_img, background_scale = load_background('./graphics')
+player_icon = atlas['player']
+player_eat_icon = atlas['player_consume']
+star_icon = atlas['star']
 
-explosions = pyglet.image.load('./graphics/explosion.png')
+explosions = atlas['explosion']
 image_grid = pyglet.image.ImageGrid(explosions, 4, 3)
 texture_grid = image_grid.get_texture_sequence()
 explosion_animation = pyglet.image.Animation.from_image_sequence(texture_grid, 0.1, loop = True)
@@ -43,30 +84,28 @@ background = pyglet.graphics.OrderedGroup(0) # background first
 foreground = pyglet.graphics.OrderedGroup(1) # then foreground
 background_sprite = gt.BackgroundSprite(background_img, sol.r[1],\
                                        batch = main_batch, group = background)
+background_sprite.scale = background_scale # as large as the full size image
+
+# debris is drawn as points, all in one vertex list
+debris = main_batch.add(N_DEBRIS, pyglet.gl.GL_POINTS, foreground,
+                        ('v2f/stream', transform(sol.pr).ravel()),
+                        ('c3B/static', [180, 170, 160]*N_DEBRIS))
 
-bodies = [] # group all bodies in a list
 # create player object
 player = gt.CelestialObject(player_icon, sol.r[0], batch = main_batch, group = foreground)
-star = gt.CelestialObject(star_icon, sol.r[1], batch = main_batch, group = foreground)
-# add star first, then planets
-bodies.append(player)
-bodies.append(star)
-for i in range(n_planets):
-    planet_icon = gt.load_sprite_image(f'./graphics/p{i+1}.png')
-    bodies.append(gt.CelestialObject(planet_icon, sol.r[i+2], batch = main_batch, group = foreground))
-
-for i in range(n_bodies):
-    bodies[i].scale = sol.radius[i]*2*transform.scale/bodies[i].width
+player.scale = sol.radius[0]*2*transform.scale/player.width
+# star and planets are all drawn by one renderer, from the atlas texture
+renderer = BodyRenderer(sol.store, atlas.texture, WIDTH, HEIGHT, main_batch, foreground)
+renderer.set_body(1, star_icon, sol.radius[1]*2*transform.scale)
+for i in range(len(sol.r) - 2): # planet images are reused if there are more planets
+    renderer.set_body(i+2, atlas[f'p{i % N_PLANET_IMAGES + 1}'], sol.radius[i+2]*2*transform.scale)
 
 t_zero = time.time()
 
-THRUST = 1e-4 # units?!
-FLOW_RATE = 1e-5 # units!
 DTHETA = 2 # gyroscopic rotation, in degrees
-EAT_DISTANCE = 1 # AU, maximum distance at which planet is consumed
-DRY_MASS = 1e-5 # mass of space ship without fuel (solar masses)
-DM = 1e-4 # rate at which objects are consumed
-VARS = {'time': t_zero, 'dt' : 1/100, 'was_close' : False}
+VARS = {'time': t_zero, 'dt' : FRAME_DT, 'was_close' : False, 'consumed': 0, 'frame': 0, 'hud': False,
+        'step': 0, 'speed': args.speed} # replay step and speed
+HUD_INTERVAL = 30 # frames between updates of the performance HUD
 
 time_label = pyglet.text.Label('Time: 0', x = WIDTH*0.89, y = HEIGHT*0.95,
                                 batch = main_batch, group = foreground)
@@ -77,27 +116,50 @@ progress_label = pyglet.text.Label(f'Objects Consumed: {0}/{n_bodies - 1} ',
                                    x = WIDTH*0.89, y = HEIGHT*0.91)
 mass_label = pyglet.text.Label(f'Fuel: %.3E' %(sol.m[0] - DRY_MASS), batch = main_batch, group = foreground,
                                 x = WIDTH*0.89, y = HEIGHT*0.89)
+# performance HUD, empty until P is pressed
+perf_label = pyglet.text.Label('', font_name = 'Courier New', font_size = 10,
+                               multiline = True, width = WIDTH*0.2, anchor_y = 'top',
+                               x = WIDTH*0.01, y = HEIGHT*0.98,
+                               batch = main_batch, group = foreground)
+
+@window.event
+def on_key_press(symbol, modifiers):
+    if symbol == key.P: # toggle performance HUD
+        VARS['hud'] = not VARS['hud']
+        perf_label.text = profiler.report() if VARS['hud'] else ''
+    elif symbol == key.O: # save timings
+        filename = 'profile_%d.json' %(time.time())
+        profiler.dump(filename)
+        print('Saved frame timings to', filename)
 
 @window.event
 def on_draw():
     # draw all objects in game window
     window.clear() # refresh
-    main_batch.draw()
+    with profiler.stage('draw'):
+        main_batch.draw()
 
 def update(refresh_rate):
-    # Controls first, see if anything has happened
+    with profiler.stage('frame'):
+        replay_frame() if recording else frame()
+    VARS['frame'] += 1
+    if VARS['hud'] and VARS['frame'] % HUD_INTERVAL == 0:
+        perf_label.text = profiler.report()
 
+def zoom_controls():
     # zoom functionality
     if controller[key.DOWN]:
 
         transform.zoom *= 0.975
-        for body in bodies:
-            body.zoom(0.975)
+        player.zoom(0.975)
 
     if controller[key.UP]:
         transform.zoom *= 1.025
-        for body in bodies:
-            body.zoom(1.025)
+        player.zoom(1.025)
+
+def frame():
+    # Controls first, see if anything has happened
+    zoom_controls()
 
     # Boosting
     if controller[key.W] and sol.m[0] > DRY_MASS:
@@ -128,14 +190,52 @@ def update(refresh_rate):
     VARS['time'] = time.time() - t_zero #VARS['dt'] # update time
     time_label.text = 'Time: %.2f' %(VARS['time'])
     # this is where we update the window, and the game actually happens
-    sol.update(VARS['dt']) # update solar system motions with time step dt
-    # then shift from solar system coordinates to screen coordinates
-    screen_coordinates = transform(sol.r)
-    # update the sprites (icons) accordingly
-    background_sprite.update(sol.v[1]*VARS['dt']*transform.scale/transform.zoom) # update background to follow star
-    for j, body in enumerate(bodies):
-        body.update(screen_coordinates[j])
+    if sim.recorder is not None:
+        sim.recorder.rotation = player.rotation
+        sim.recorder.inputs = inputs_mask([controller[k] for k in INPUT_KEYS])
+    with profiler.stage('physics'):
+        sim.advance(VARS['dt']) # advance solar system by dt, in fixed physics steps
+    with profiler.stage('merge'):
+        merge_overlaps(sol, protect = [sol.rf]) # bodies that run into each other merge
+    draw_bodies(sim.positions(), sim.particle_positions(), VARS['dt'])
+    with profiler.stage('collisions'):
+        eat_check()
+
+def replay_frame():
+    # replay: bodies are loaded from the recording, at VARS['speed'] steps per frame
+    zoom_controls()
+    if controller[key.COMMA]:
+        VARS['speed'] *= 0.98
+    if controller[key.PERIOD]:
+        VARS['speed'] *= 1.02
+    # scrub backwards/forwards, through the whole recording in 5 seconds
+    scrub = len(recording)/(5*FPS)
+    step = VARS['step'] + VARS['speed'] + scrub*(controller[key.RIGHT] - controller[key.LEFT])
+    VARS['step'] = np.clip(step, 0, len(recording) - 1)
+    with profiler.stage('replay'):
+        state = recording.load(int(VARS['step']), sol)
+    player.rotation = state['rotation']
+    time_label.text = 'Time: %.2f' %(state['time'])
+    sim_label.text = 'Replay: %d/%d' %(VARS['step'], len(recording))
+    draw_bodies(sol.r, sol.pr, VARS['speed']*recording.dt)
+
+def draw_bodies(positions, particle_positions, frame_time):
+    # move sprites and vertices to the bodies, frame_time [yr] is the time since the last frame
+    with profiler.stage('transform'):
+        # shift from solar system coordinates to screen coordinates
+        screen_coordinates = transform(positions)
+        debris_coordinates = transform(particle_positions)
+    with profiler.stage('render'):
+        # update the sprites (icons) accordingly
+        background_sprite.update(sol.v[1]*frame_time*transform.scale/transform.zoom) # update background to follow star
+        player.update(screen_coordinates[0])
+        sizes = sol.radius*2*transform.scale # radii change in merges and bites
+        sizes[0] = 0 # the player is drawn by its own sprite
+        renderer.update(screen_coordinates, transform.zoom, sizes) # all other bodies at once
+        # write debris positions straight into the vertex buffer
+        np.ctypeslib.as_array(debris.vertices)[:] = debris_coordinates.ravel()
 
+def eat_check():
     # Collision detection + fuel conversion
     # Check if any object is close enough to be converted to fuel
     dist_to_player = np.linalg.norm(sol.r[1:], axis = 1) - sol.radius[1:]  # distance to surface
@@ -150,24 +250,24 @@ def update(refresh_rate):
         too_close = dist_to_player < 0 # inside surface --> collision
         if np.any(too_close):
             player.image = explosion_animation
-            #sys.exit() # if too close, game over
 
         if controller[key.SPACE]:
             object_id = np.argmin(dist_to_player) + 1
             consumed = sol.convert_to_fuel(object_id, DM) # and remove object from calculations
             mass_label.text = f'Fuel: %.3E' %(sol.m[0] - DRY_MASS)
             if consumed:
-                bodies[object_id].delete() # remove sprite
-                del(bodies[object_id]) # and list entry
-                objects_consumed = n_bodies - len(bodies)
-                progress_label.text = f'Objects Consumed: {objects_consumed}/{n_bodies - 1}'
+                VARS['consumed'] += 1
+                total = VARS['consumed'] + len(sol.r) - 1 # merged bodies count once
+                progress_label.text = f'Objects Consumed: {VARS["consumed"]}/{total}'
 
     elif close_enough:
         VARS['was_close'] = True
         player.image = player_eat_icon
 
 
-pyglet.clock.schedule_interval(update, 1/120.0) # update game every 1/120 seconds
+pyglet.clock.schedule_interval(update, 1/FPS) # update game every 1/120 seconds
 
 if __name__ == '__main__':
     pyglet.app.run()
+    if sim.recorder is not None:
+        sim.recorder.close()
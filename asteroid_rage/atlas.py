@@ -0,0 +1,157 @@
+import os
+import sys
+import json
+import numpy as np
+import pyglet
+import PIL.Image
+# texture atlas of the game graphics, built once and cached as raw pixels
+
+GRAPHICS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'graphics')
+CACHE_DIR = 'atlas' # inside the graphics folder
+ATLAS_WIDTH = 2048
+MAX_SIZE = 512 # longest side of a sprite in the atlas [pixels]
+# images that go into the atlas, and the longest side each may have (None = full size)
+SOURCES = {'player': MAX_SIZE, 'player_consume': MAX_SIZE, 'star': MAX_SIZE,
+           'p1': MAX_SIZE, 'p2': MAX_SIZE, 'p3': MAX_SIZE, 'p4': MAX_SIZE,
+           'p5': MAX_SIZE, 'p6': MAX_SIZE, 'p7': MAX_SIZE,
+           'explosion': None} # sprite sheet, kept at full size so frames stay aligned
+BACKGROUND = 'background' # too large for the atlas, cached on its own
+BACKGROUND_MAX_SIZE = 4096 # longest side of the cached background [pixels]
+VERSION = 1 # bump to invalidate old caches
+
+def read_rgba(filename):
+    # decode an image into an (height, width, 4) uint8 array, bottom row first like pyglet
+    # (PIL, so the build step also runs without a display)
+    pixels = np.asarray(PIL.Image.open(filename).convert('RGBA'))
+    return pixels[::-1]
+
+def shrink(pixels, max_size):
+    # downscale by an integer factor (box filter) until the longest side fits max_size
+    factor = int(np.ceil(max(pixels.shape[:2])/max_size)) if max_size else 1
+    if factor <= 1:
+        return pixels
+    h, w = pixels.shape[0]//factor, pixels.shape[1]//factor
+    blocks = pixels[:h*factor, :w*factor].reshape(h, factor, w, factor, 4)
+    return blocks.mean(axis = (1, 3)).round().astype(np.uint8)
+
+def pack(sizes, width = ATLAS_WIDTH):
+    # shelf packing: place (w, h) rectangles in rows, tallest first
+    # returns the (x, y) of each rectangle, and the (power of two) atlas height
+    order = sorted(range(len(sizes)), key = lambda i: -sizes[i][1])
+    positions = [None]*len(sizes)
+    x = y = shelf = 0
+    for i in order:
+        w, h = sizes[i]
+        if x + w > width:
+            x, y, shelf = 0, y + shelf, 0 # next shelf
+        positions[i] = (x, y)
+        x += w + 1 # 1 pixel gap, so filtering doesn't bleed between images
+        shelf = max(shelf, h + 1)
+    height = 2**int(np.ceil(np.log2(max(y + shelf, 1))))
+    return positions, height
+
+def source_stamp(graphics_dir, names = SOURCES):
+    # modification time and size of every source, to tell if the cache is current
+    stamp = {}
+    for name in names:
+        info = os.stat(os.path.join(graphics_dir, name + '.png'))
+        stamp[name] = [info.st_mtime_ns, info.st_size]
+    return stamp
+
+def build_atlas(graphics_dir = GRAPHICS_DIR):
+    # decode, shrink and pack all sources, and write the cache
+    images = {name: shrink(read_rgba(os.path.join(graphics_dir, name + '.png')), max_size)
+              for name, max_size in SOURCES.items()}
+    names = list(images)
+    positions, height = pack([images[name].shape[1::-1] for name in names])
+    pixels = np.zeros((height, ATLAS_WIDTH, 4), dtype = np.uint8)
+    regions = {}
+    for name, (x, y) in zip(names, positions):
+        h, w = images[name].shape[:2]
+        pixels[y:y + h, x:x + w] = images[name]
+        regions[name] = [x, y, w, h]
+    cache = os.path.join(graphics_dir, CACHE_DIR)
+    os.makedirs(cache, exist_ok = True)
+    pixels.tofile(os.path.join(cache, 'atlas.rgba'))
+    index = {'version': VERSION, 'width': ATLAS_WIDTH, 'height': height,
+             'sources': source_stamp(graphics_dir), 'regions': regions}
+    with open(os.path.join(cache, 'atlas.json'), 'w') as f:
+        json.dump(index, f, indent = 1)
+    return index
+
+def cached_index(graphics_dir = GRAPHICS_DIR, name = 'atlas', sources = SOURCES):
+    # index of the cached image name (the atlas or the background), or None
+    # if there is none or it is out of date
+    try:
+        with open(os.path.join(graphics_dir, CACHE_DIR, name + '.json')) as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if index.get('version') != VERSION or index.get('sources') != source_stamp(graphics_dir, sources):
+        return None
+    if not os.path.exists(os.path.join(graphics_dir, CACHE_DIR, name + '.rgba')):
+        return None
+    return index
+
+def build_background(graphics_dir = GRAPHICS_DIR):
+    # decode and downscale the background, and write its cache
+    # PIL's reduce() is a box filter, without going through a full size array
+    image = PIL.Image.open(os.path.join(graphics_dir, BACKGROUND + '.png')).convert('RGBA')
+    factor = int(np.ceil(max(image.size)/BACKGROUND_MAX_SIZE))
+    if factor > 1:
+        image = image.reduce(factor)
+    pixels = np.asarray(image)[::-1] # bottom row first, like pyglet
+    cache = os.path.join(graphics_dir, CACHE_DIR)
+    os.makedirs(cache, exist_ok = True)
+    pixels.tofile(os.path.join(cache, BACKGROUND + '.rgba'))
+    index = {'version': VERSION, 'width': image.width, 'height': image.height,
+             'scale': factor, 'sources': source_stamp(graphics_dir, [BACKGROUND])}
+    with open(os.path.join(cache, BACKGROUND + '.json'), 'w') as f:
+        json.dump(index, f, indent = 1)
+    return index
+
+def load_background(graphics_dir = GRAPHICS_DIR):
+    # the background image from its cache (rebuilt if out of date), anchored at
+    # its centre, and the sprite scale that draws it at the size of the source
+    index = cached_index(graphics_dir, BACKGROUND, [BACKGROUND]) or build_background(graphics_dir)
+    data = open(os.path.join(graphics_dir, CACHE_DIR, BACKGROUND + '.rgba'), 'rb').read()
+    image = pyglet.image.ImageData(index['width'], index['height'], 'RGBA', data, index['width']*4)
+    image.anchor_x = image.width // 2
+    image.anchor_y = image.height // 2
+    return image, index['scale']
+
+class Atlas:
+    def __init__(self, graphics_dir = GRAPHICS_DIR):
+        '''
+        All game sprites in one texture. Uses the cached atlas when it is
+        current (no image decoding at all), and rebuilds it otherwise.
+        atlas[name] gives the image region of graphics/name.png, anchored at
+        its centre, ready for sprites or the BodyRenderer.
+        '''
+        index = cached_index(graphics_dir) or build_atlas(graphics_dir)
+        data = open(os.path.join(graphics_dir, CACHE_DIR, 'atlas.rgba'), 'rb').read()
+        image = pyglet.image.ImageData(index['width'], index['height'], 'RGBA',
+                                       data, index['width']*4)
+        self.texture = image.get_texture()
+        self.regions = index['regions']
+
+    def __getitem__(self, name):
+        x, y, w, h = self.regions[name]
+        region = self.texture.get_region(x, y, w, h)
+        region.anchor_x = w // 2
+        region.anchor_y = h // 2
+        return region
+
+if __name__ == '__main__':
+    # build step: python atlas.py [graphics folder]
+    graphics_dir = sys.argv[1] if len(sys.argv) > 1 else GRAPHICS_DIR
+    if cached_index(graphics_dir):
+        print('Atlas is up to date')
+    else:
+        index = build_atlas(graphics_dir)
+        print('Built %dx%d atlas with %d images' %(index['width'], index['height'], len(index['regions'])))
+    if cached_index(graphics_dir, BACKGROUND, [BACKGROUND]):
+        print('Background is up to date')
+    else:
+        index = build_background(graphics_dir)
+        print('Built %dx%d background' %(index['width'], index['height']))
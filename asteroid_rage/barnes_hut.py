@@ -0,0 +1,190 @@
+import time
+import numpy as np
+
+from solar_system import G, DirectGravity
+from utils import expand
+# Barnes-Hut quadtree gravity, O(N log N) instead of O(N^2)
+
+MAX_LEVEL = 16 # deepest level of the tree, 2^16 cells along each axis
+LEAF_SIZE = 8 # cells with at most this many particles are leaves, summed directly
+
+def spread_bits(x):
+    # spread the lower 16 bits of x out, so that bit b ends up at position 2b
+    x = x & 0xFFFF
+    x = (x | (x << 8)) & 0x00FF00FF
+    x = (x | (x << 4)) & 0x0F0F0F0F
+    x = (x | (x << 2)) & 0x33333333
+    x = (x | (x << 1)) & 0x55555555
+    return x
+
+def morton_keys(r, lo, size):
+    # z-order keys; sorting by key puts every quadtree cell in one contiguous run
+    cells = 2**MAX_LEVEL
+    ij = ((r - lo)/size*cells).astype(np.int64)
+    ij = np.clip(ij, 0, cells - 1)
+    return spread_bits(ij[:, 0]) << 1 | spread_bits(ij[:, 1])
+
+class QuadTree:
+    def __init__(self, r, m):
+        '''
+        Quadtree stored as flat NumPy arrays, one entry per node.
+        Particles are sorted along a z-order curve, so each node owns the
+        contiguous range [start, end) of the sorted particles. Cells are only
+        split while they hold more than LEAF_SIZE particles.
+        r: positions, shape (n, 2)
+        m: masses, shape (n,)
+        '''
+        n = len(r)
+        lo = np.amin(r, axis = 0)
+        size = np.amax(np.amax(r, axis = 0) - lo)*(1 + 1e-9)
+        size = size if size > 0 else 1.0
+        keys = morton_keys(r, lo, size)
+        self.order = np.argsort(keys, kind = 'stable')
+        keys = keys[self.order]
+        self.r = r[self.order] # sorted positions
+        self.m = m[self.order] # sorted masses
+
+        start, count, level_size = [], [], []
+        parent_count = np.array([n]) # the root is always a node
+        for level in range(MAX_LEVEL + 1):
+            k = keys >> (2*(MAX_LEVEL - level))
+            cell_first = np.flatnonzero(np.r_[True, k[1:] != k[:-1]]) # cell starts
+            cell_count = np.diff(np.r_[cell_first, n])
+            first, n_cell = cell_first, cell_count
+            if level > 0:
+                # a cell is a node if its parent cell was split
+                is_node = parent_count[first] > LEAF_SIZE
+                first, n_cell = first[is_node], n_cell[is_node]
+            if len(first) == 0:
+                break
+            start.append(first)
+            count.append(n_cell)
+            level_size.append(np.full(len(first), size/2**level))
+            parent_count = np.repeat(cell_count, cell_count) # per sorted particle
+
+        # link every node to its children on the level below
+        offset = np.cumsum([0] + [len(s) for s in start])
+        child_first, child_count = [], []
+        for level in range(len(start)):
+            if level + 1 < len(start):
+                below = start[level + 1]
+                lo_i = np.searchsorted(below, start[level])
+                hi_i = np.searchsorted(below, start[level] + count[level])
+                child_first.append(lo_i + offset[level + 1])
+                child_count.append(hi_i - lo_i)
+            else:
+                child_first.append(np.zeros(len(start[level]), dtype = np.int64))
+                child_count.append(np.zeros(len(start[level]), dtype = np.int64))
+
+        self.start = np.concatenate(start)
+        self.end = self.start + np.concatenate(count)
+        self.size = np.concatenate(level_size) # side length of each node
+        self.child_first = np.concatenate(child_first)
+        self.child_count = np.concatenate(child_count)
+        # monopole moments of each node, from prefix sums over the sorted particles
+        cm = np.r_[0, np.cumsum(self.m)]
+        cmr = np.r_[np.zeros((1, 2)), np.cumsum(self.m[:, np.newaxis]*self.r, axis = 0)]
+        cr = np.r_[np.zeros((1, 2)), np.cumsum(self.r, axis = 0)]
+        self.mass = cm[self.end] - cm[self.start]
+        with np.errstate(invalid = 'ignore', divide = 'ignore'):
+            com = (cmr[self.end] - cmr[self.start])/self.mass[:, np.newaxis]
+        # massless nodes (e.g. only test particles) get their geometric centre
+        centre = (cr[self.end] - cr[self.start])/(self.end - self.start)[:, np.newaxis]
+        self.com = np.where(self.mass[:, np.newaxis] > 0, com, centre)
+
+class BarnesHutGravity:
+    def __init__(self, theta = 0.5, softening = 0):
+        '''
+        Barnes-Hut tree gravity, drop-in replacement for DirectGravity
+        theta: opening angle; nodes with size/distance < theta are treated
+        as a single point mass. theta = 0 reproduces direct summation.
+        softening: Plummer softening length [AU]
+        '''
+        self.theta = theta
+        self.softening = softening
+
+    def __call__(self, r, m):
+        n = len(r)
+        tree = QuadTree(r, m)
+        eps2 = self.softening**2
+        theta2 = self.theta**2
+        acc = np.zeros((n, 2))
+        # the leaves partition the sorted particles; each one is walked as a group,
+        # with a node far for the group if it is far from the group's bounding box
+        leaves = np.flatnonzero(tree.child_count == 0)
+        leaves = leaves[np.argsort(tree.start[leaves])]
+        group_start = tree.start[leaves]
+        group_count = tree.end[leaves] - group_start
+        lo = np.minimum.reduceat(tree.r, group_start)
+        hi = np.maximum.reduceat(tree.r, group_start)
+        # walk the tree for all groups at once, as a list of (group, node) pairs
+        # (rows are gathered with np.take, which is much faster than fancy indexing)
+        g = np.arange(len(leaves))
+        node = np.zeros(len(leaves), dtype = np.int64)
+        while len(g) > 0:
+            com = np.take(tree.com, node, axis = 0)
+            gap = np.maximum(np.take(lo, g, axis = 0) - com, 0)\
+                  + np.maximum(com - np.take(hi, g, axis = 0), 0) # to the nearest box edge
+            dist2 = np.einsum('ij,ij->i', gap, gap)
+            contains = (tree.start[node] <= group_start[g]) & (group_start[g] < tree.end[node])
+            far = (tree.size[node]**2 < theta2*dist2) & ~contains
+            leaf = tree.child_count[node] == 0
+
+            # distant nodes act as one point mass on every particle of the group
+            owner, p = expand(group_start[g[far]], group_count[g[far]])
+            far_node = node[far][owner]
+            d = np.take(tree.com, far_node, axis = 0) - np.take(tree.r, p, axis = 0)
+            self.accumulate(acc, p, d, np.einsum('ij,ij->i', d, d), tree.mass[far_node], eps2)
+
+            # nearby leaves are summed directly, particle by particle
+            near_leaf = leaf & ~far
+            owner, i = expand(group_start[g[near_leaf]], group_count[g[near_leaf]])
+            near_node = node[near_leaf][owner]
+            owner, j = expand(tree.start[near_node], tree.end[near_node] - tree.start[near_node])
+            i = i[owner] # includes i == j, where dj = 0 adds nothing
+            dj = np.take(tree.r, j, axis = 0) - np.take(tree.r, i, axis = 0)
+            self.accumulate(acc, i, dj, np.einsum('ij,ij->i', dj, dj), tree.m[j], eps2)
+
+            # everything else is opened, and its children visited next
+            opened = ~leaf & ~far
+            owner, node = expand(tree.child_first[node[opened]], tree.child_count[node[opened]])
+            g = g[opened][owner]
+
+        out = np.empty_like(acc)
+        out[tree.order] = acc # back to the original body order
+        return out
+
+    @staticmethod
+    def accumulate(acc, p, d, dist2, mass, eps2):
+        # add G*mass*d/|d|^3 to the particles p (which may repeat)
+        s = dist2 + eps2
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            w = G*mass/(s*np.sqrt(s))
+        w[s == 0] = 0 # coincident particles exert no force
+        acc[:, 0] += np.bincount(p, weights = w*d[:, 0], minlength = len(acc))
+        acc[:, 1] += np.bincount(p, weights = w*d[:, 1], minlength = len(acc))
+
+def check_accuracy(r, m, theta = 0.5, softening = 0):
+    # compare tree accelerations to direct summation
+    # returns median and maximum error of the acceleration, relative to the mean
+    # magnitude of all accelerations (relative to each body's own acceleration,
+    # bodies whose pulls nearly cancel would dominate the maximum)
+    exact = DirectGravity(softening)(r, m)
+    approx = BarnesHutGravity(theta, softening)(r, m)
+    err = np.linalg.norm(approx - exact, axis = 1)/np.mean(np.linalg.norm(exact, axis = 1))
+    return np.median(err), np.amax(err)
+
+if __name__ == '__main__':
+    # quick accuracy and speed check against the direct kernel
+    n = 2000
+    r = np.random.uniform(-30, 30, (n, 2))
+    m = np.random.uniform(1e-6, 1e-2, n)
+    for theta in [0.3, 0.5, 0.7, 1.0]:
+        med, worst = check_accuracy(r, m, theta)
+        print('theta = %.1f: median error %.2E, max error %.2E' %(theta, med, worst))
+    t0 = time.perf_counter()
+    DirectGravity()(r, m)
+    t1 = time.perf_counter()
+    BarnesHutGravity(0.5)(r, m)
+    t2 = time.perf_counter()
+    print('n = %d: direct %.3f s, tree %.3f s' %(n, t1 - t0, t2 - t1))
@@ -0,0 +1,70 @@
+import numpy as np
+# fixed capacity storage for bodies, so removing one never reallocates anything
+
+class BodyStore:
+    def __init__(self, capacity, columns):
+        '''
+        Struct of arrays holding up to capacity bodies.
+        columns: dict of name: (shape per body, dtype), e.g. {'r': ((2,), float)}
+        The n active bodies are always the first n slots, so view(name) is a
+        plain array. remove() moves the last active body into the freed slot,
+        which is O(1) and allocation free. Bodies keep a stable id for their
+        whole life; slot_of[id] is the body's current slot (-1 once removed).
+        objects is a list of Python objects (e.g. sprites), kept aligned with the slots.
+        '''
+        self.capacity = capacity
+        self.n = 0 # number of active bodies
+        self.data = {}
+        for name, (shape, dtype) in columns.items():
+            self.add_column(name, shape, dtype)
+        self.ids = np.zeros(capacity, dtype = int) # id of the body in each slot
+        self.slot_of = np.full(capacity, -1) # slot of each id
+        self.objects = [None]*capacity
+        self.next_id = 0 # ids are never reused
+
+    def add_column(self, name, shape = (), dtype = float):
+        # add a per-body column, which is moved around together with the others
+        self.data[name] = np.zeros((self.capacity,) + tuple(shape), dtype = dtype)
+
+    def view(self, name):
+        # the active part of a column
+        return self.data[name][:self.n]
+
+    def extend(self, **columns):
+        # add bodies, one value per body for (some of) the columns; returns their ids
+        k = len(next(iter(columns.values())))
+        if self.next_id + k > self.capacity:
+            raise ValueError('BodyStore is full')
+        slots = np.arange(self.n, self.n + k)
+        ids = np.arange(self.next_id, self.next_id + k)
+        for name, values in columns.items():
+            self.data[name][slots] = values
+        self.ids[slots] = ids
+        self.slot_of[ids] = slots
+        self.n += k
+        self.next_id += k
+        return ids
+
+    def remove(self, slot):
+        # remove the body in slot, by moving the last active body into its place
+        # returns the id of the removed body
+        last = self.n - 1
+        removed = self.ids[slot]
+        if slot != last:
+            for column in self.data.values():
+                column[slot] = column[last]
+            self.ids[slot] = self.ids[last]
+            self.slot_of[self.ids[slot]] = slot
+            self.objects[slot] = self.objects[last]
+        self.objects[last] = None
+        self.slot_of[removed] = -1
+        self.n = last
+        return removed
+
+def column(name):
+    # property exposing the active part of a BodyStore column as an array
+    def get(self):
+        return self.store.view(name)
+    def set(self, value):
+        self.store.view(name)[...] = value
+    return property(get, set)
@@ -0,0 +1,89 @@
+import numpy as np
+
+from utils import expand
+# body-body collisions: spatial hash broad phase, and merging of overlapping bodies
+
+# neighbouring cells to search from each cell; only half of them, so that
+# every pair of neighbouring cells is visited once
+HALF_NEIGHBOURHOOD = np.array([[0, 0], [1, -1], [1, 0], [1, 1], [0, 1]])
+
+def find_overlaps(r, radius, cell_size = None):
+    # all pairs (i, j), i < j, of bodies whose discs overlap
+    # bodies are hashed into a uniform grid of cell_size, so only bodies in
+    # neighbouring cells are compared. The few bodies much larger than the rest
+    # (e.g. the star) are compared with every other body; by default cells are
+    # as large as the largest remaining body.
+    n = len(r)
+    if n == 0:
+        return np.zeros(0, dtype = int), np.zeros(0, dtype = int)
+    if cell_size is None:
+        big = radius > 4*np.percentile(radius, 90)
+        cell_size = 2*np.amax(radius[~big], initial = 0)
+    cell_size = cell_size if cell_size > 0 else 1
+    big = radius > cell_size/2
+    small = np.flatnonzero(~big)
+
+    # broad phase: sort small bodies by cell, then look up neighbouring cells
+    cell = np.floor(r[small]/cell_size).astype(np.int64)
+    cell -= np.amin(cell, axis = 0, initial = 0) - 1 # no negative cells
+    rows = np.amax(cell[:, 1], initial = 0) + 2 # neighbours of a cell stay in range
+    key = cell[:, 0]*rows + cell[:, 1]
+    order = np.argsort(key, kind = 'stable')
+    sorted_key = key[order]
+    i, j = [], []
+    for dx, dy in HALF_NEIGHBOURHOOD:
+        neighbour = key + dx*rows + dy
+        lo = np.searchsorted(sorted_key, neighbour, 'left')
+        hi = np.searchsorted(sorted_key, neighbour, 'right')
+        owner, k = expand(lo, hi - lo)
+        a, b = small[owner], small[order[k]]
+        if dx == 0 and dy == 0:
+            keep = a < b # same cell: each pair once, and no body with itself
+            a, b = a[keep], b[keep]
+        i.append(a)
+        j.append(b)
+
+    # big bodies against everything (big pairs only once)
+    big = np.flatnonzero(big)
+    a = np.repeat(big, n)
+    b = np.tile(np.arange(n), len(big))
+    keep = (b != a) & ~(np.isin(b, big) & (b < a))
+    i.append(a[keep])
+    j.append(b[keep])
+
+    i = np.concatenate(i).astype(int)
+    j = np.concatenate(j).astype(int)
+    # narrow phase: exact overlap test
+    overlap = np.sum((r[i] - r[j])**2, axis = -1) < (radius[i] + radius[j])**2
+    i, j = i[overlap], j[overlap]
+    return np.minimum(i, j), np.maximum(i, j)
+
+def merge_overlaps(sol, protect = (0,)):
+    # merge overlapping bodies in sol, conserving mass, momentum and volume
+    # the heavier body absorbs the lighter one; each body merges at most once per call.
+    # Bodies in protect (the player) never merge. Returns the objects (sprites) of
+    # the removed bodies, so the caller can delete them.
+    i, j = find_overlaps(sol.r, sol.radius)
+    merged = np.zeros(len(sol.r), dtype = bool)
+    merged[list(protect)] = True
+    absorbed = []
+    for a, b in zip(i, j):
+        if merged[a] or merged[b]:
+            continue
+        merged[a] = merged[b] = True
+        if sol.m[a] < sol.m[b]:
+            a, b = b, a # a absorbs b
+        m = sol.m[a] + sol.m[b]
+        sol.r[a] = (sol.m[a]*sol.r[a] + sol.m[b]*sol.r[b])/m # centre of mass
+        sol.v[a] = (sol.m[a]*sol.v[a] + sol.m[b]*sol.v[b])/m # momentum
+        volume = sol.m[a]/sol.rho[a] + sol.m[b]/sol.rho[b]
+        sol.rho[a] = m/volume
+        sol.radius[a] = (sol.radius[a]**3 + sol.radius[b]**3)**(1/3) # radius^3 ~ volume
+        sol.m[a] = m
+        absorbed.append(b)
+
+    objects = []
+    for b in sorted(absorbed, reverse = True): # the last body fills each gap
+        objects.append(sol.objects[b])
+        sol.remove(b)
+    return objects
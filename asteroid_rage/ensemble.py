@@ -0,0 +1,108 @@
+import numpy as np
+
+from solar_system import G, DirectGravity, initial_conditions
+from integrators import INTEGRATORS
+# many independent solar systems, advanced together in one set of arrays
+
+class EnsembleSolarSystem:
+    def __init__(self, n_systems, n_bodies, scale, softening = 0,
+                 integrator = 'euler_cromer', rng = None):
+        '''
+        n_systems independent solar systems, stored along a leading ensemble axis:
+        r, v have shape (n_systems, n_bodies, 2), and m, rho, radius, alive
+        have shape (n_systems, n_bodies). Bodies removed by convert_to_fuel are
+        masked out (alive = False, m = 0) instead of deleted, so every system
+        keeps the same shape. Uses the same integrators as SolarSystem, except
+        block time steps.
+        rng: random generator for initial conditions, default np.random
+        '''
+        self.n_systems = n_systems
+        self.n_bodies = n_bodies
+        self.scale = scale
+        self.softening = softening
+        self.rf = 0 # player-centred reference frame, as in SolarSystem
+        self.rng = np.random if rng is None else rng
+        if integrator == 'block':
+            raise ValueError('Block time steps are not supported for ensembles')
+        self.integrator = INTEGRATORS[integrator]
+        self.gravity = DirectGravity(softening)
+        self.r, self.v, self.m, self.rho = self.initialize_system()
+        self.radius = (self.m/(self.rho*4/3*np.pi))**(1/3)*500 # radii
+        self.alive = np.ones((n_systems, n_bodies), dtype = bool)
+        # no test particles, but integrators expect them
+        self.pr = np.zeros((n_systems, 0, 2))
+        self.pv = np.zeros((n_systems, 0, 2))
+        self.t = 0
+        self.acc = None
+        self.force_evals = 0
+
+    def initialize_system(self):
+        # same initial conditions as SolarSystem, for every system
+        return initial_conditions(self.rng, self.scale, (self.n_systems, self.n_bodies))
+
+    def update(self, dt):
+        self.integrator(self, dt)
+        # shift every system to its own player's frame
+        v_rf = self.v[:, self.rf, np.newaxis].copy()
+        r_rf = self.r[:, self.rf, np.newaxis].copy()
+        self.v -= v_rf
+        self.r -= r_rf
+        self.t += dt
+
+    def accelerations(self):
+        # accelerations of all bodies in all systems; removed bodies have m = 0
+        if self.acc is None:
+            self.acc = (self.gravity(self.r, self.m), self.pr)
+            self.force_evals += 1
+        return self.acc
+
+    def invalidate(self):
+        self.acc = None
+
+    def kick(self, dt):
+        acc, pacc = self.accelerations()
+        self.v += dt*acc
+
+    def drift(self, dt):
+        self.r += dt*self.v
+        self.invalidate()
+
+    def get_state(self):
+        return self.r, self.v, self.pr, self.pv
+
+    def set_state(self, r, v, pr, pv):
+        self.r, self.v, self.pr, self.pv = r, v, pr, pv
+        self.invalidate()
+
+    def energy(self):
+        # total energy of each system in its centre of mass frame, shape (n_systems,)
+        m = self.m
+        v_cm = np.sum(m[..., np.newaxis]*self.v, axis = 1, keepdims = True)/np.sum(m, axis = 1)[:, np.newaxis, np.newaxis]
+        kinetic = 0.5*np.sum(m*np.sum((self.v - v_cm)**2, axis = -1), axis = -1)
+        d = self.r[:, np.newaxis] - self.r[:, :, np.newaxis]
+        dist = np.sqrt(np.sum(d**2, axis = -1) + self.softening**2)
+        i, j = np.triu_indices(self.n_bodies, 1)
+        potential = -G*np.sum(m[:, i]*m[:, j]/dist[:, i, j], axis = -1)
+        return kinetic + potential
+
+    def convert_to_fuel(self, systems, ids, dm):
+        # as StudentSolarSystem.convert_to_fuel, for body ids[k] in system systems[k]
+        # (at most one body per system per call); consumed bodies are masked out.
+        # Returns which bodies were consumed
+        systems = np.asarray(systems)
+        ids = np.asarray(ids)
+        after_mass = self.m[systems, ids] - dm
+        consumed = after_mass < 0
+        gained = np.where(consumed, self.m[systems, ids], dm)
+        self.m[systems, 0] += gained
+        self.m[systems, ids] -= gained
+        eaten = (systems[consumed], ids[consumed])
+        self.alive[eaten] = False
+        self.m[eaten] = 0 # no longer exerts any force
+        self.v[eaten] = 0
+        self.radius[eaten] = 0
+        kept = (systems[~consumed], ids[~consumed])
+        self.radius[kept] = (self.m[kept]/(self.rho[kept]*4/3*np.pi))**(1/3)*200 # radii
+        self.radius[systems, 0] = (self.m[systems, 0]/(self.rho[systems, 0]*4/3*np.pi))**(1/3)*200
+        self.invalidate()
+        return consumed
@@ -1,7 +1,5 @@
 import pyglet
-import numpy as np
 
-from solar_system import SolarSystem
 # module for game-related tools
 
 class CelestialObject(pyglet.sprite.Sprite):
@@ -34,28 +32,6 @@ class BackgroundSprite(pyglet.sprite.Sprite):
     def zoom(self, zoom_factor):
         self.scale *= zoom_factor
 
-
-
-class StudentSolarSystem(SolarSystem):
-    def convert_to_fuel(self, id, dm):
-        # removes body no. id from arrays r,v and m, and adds its mass to player
-        after_mass = self.m[id] - dm
-        if after_mass < 0:
-            self.m[0] = self.m[0] + self.m[id]
-            self.r = np.delete(self.r, id, axis = 0)
-            self.v = np.delete(self.v, id, axis = 0)
-            self.m = np.delete(self.m, id, axis = 0)
-            self.radius = np.delete(self.radius, id, axis = 0)
-            self.rho = np.delete(self.rho, id, axis = 0)
-            consumed = True
-        else:
-            self.m[0] = self.m[0] + dm
-            self.m[id] = self.m[id] - dm
-            self.radius[id] = (self.m[id]/(self.rho[id]*4/3*np.pi))**(1/3)*200 # radii
-            self.radius[0] = (self.m[0]/(self.rho[0]*4/3*np.pi))**(1/3)*200 # radii
-            consumed = False
-        return consumed
-
 def load_sprite_image(filename):
     # load sprite image, and anchor to its center!
     img = pyglet.image.load(filename)
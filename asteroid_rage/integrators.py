@@ -0,0 +1,127 @@
+import time
+import numpy as np
+# integrators for SolarSystem.update, selected by name from INTEGRATORS
+# each takes a system with accelerations(), kick(dt), drift(dt) and get/set_state,
+# and advances it by dt. Accelerations are cached by the system until positions change,
+# so an evaluation left over from the previous step is reused where the scheme allows.
+
+def euler_cromer(system, dt):
+    # first order, symplectic; one force evaluation per step
+    system.kick(dt)
+    system.drift(dt)
+
+def leapfrog(system, dt):
+    # velocity Verlet (kick-drift-kick), second order, symplectic
+    # the closing kick's forces are reused by the next step: one evaluation per step
+    system.kick(dt/2)
+    system.drift(dt)
+    system.kick(dt/2)
+
+# Yoshida (1990) weights for composing three leapfrog steps into a fourth order method
+W1 = 1/(2 - 2**(1/3))
+W0 = -2**(1/3)*W1
+
+def yoshida4(system, dt):
+    # fourth order, symplectic; three force evaluations per step
+    for w in (W1, W0, W1):
+        leapfrog(system, w*dt)
+
+def rk4(system, dt):
+    # classical Runge-Kutta, fourth order but not symplectic; four evaluations per step
+    state = [x.copy() for x in system.get_state()] # r, v, pr, pv
+    k = []
+    for h in (dt/2, dt/2, dt, None):
+        acc, pacc = system.accelerations()
+        r, v, pr, pv = system.get_state()
+        k.append((v.copy(), acc.copy(), pv.copy(), pacc.copy()))
+        if h is not None:
+            system.set_state(*[x + h*dx for x, dx in zip(state, k[-1])])
+    system.set_state(*[x + dt/6*(k1 + 2*k2 + 2*k3 + k4)
+                       for x, k1, k2, k3, k4 in zip(state, *k)])
+
+BLOCK_ETA = 0.03 # accuracy parameter for block time steps, dt_i = eta*|a|/|jerk|
+BLOCK_MAX_LEVEL = 10 # finest block time step is dt/2^10
+BLOCK_SAFETY = 2 # bodies whose estimated dt_i is below BLOCK_SAFETY*dt get their exact jerk
+
+def block(system, dt):
+    # leapfrog with hierarchical (power of two) time steps per body
+    # bodies get dt/2^level, with level chosen from their acceleration and jerk, so
+    # only bodies in close encounters substep; the rest only drift until their step ends.
+    # Test particles take the full step dt.
+    # The jerk is first estimated from how the (cached) accelerations changed over the
+    # previous step, in O(N); only bodies that may need substeps get their exact jerk,
+    # O(N) each. Substep forces are direct sums, also with the Barnes-Hut backend.
+    acc, pacc = system.accelerations()
+    a = acc.copy()
+    a_norm = np.linalg.norm(a, axis = -1)
+    previous = system.block_acc
+    if previous is not None and previous[1].shape == a.shape and previous[0] < system.t:
+        jerk = np.linalg.norm(a - previous[1], axis = -1)/(system.t - previous[0])
+        flagged = np.flatnonzero(BLOCK_ETA*a_norm < BLOCK_SAFETY*dt*jerk)
+    else:
+        flagged = np.arange(len(a)) # no history: first step, or bodies were removed
+    system.block_acc = (system.t, a.copy())
+    level = np.zeros(len(a), dtype = int)
+    if len(flagged) > 0:
+        jerk = np.linalg.norm(system.jerk(flagged), axis = -1)
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            dt_body = BLOCK_ETA*a_norm[flagged]/jerk
+            level[flagged] = np.clip(np.nan_to_num(np.ceil(np.log2(dt/dt_body)), nan = 0),
+                                     0, BLOCK_MAX_LEVEL)
+    level[~np.any(a, axis = -1)] = 0 # bodies without forces (on Kepler orbits) take dt
+    if not np.any(level):
+        leapfrog(system, dt) # no close encounters, the same step without the bookkeeping
+        return
+    n_sub = 2**np.amax(level) # number of substeps at the finest level
+    h = dt/n_sub
+    period = n_sub//2**level # substeps per time step, for each body
+
+    n = len(system.r)
+    evaluated = 0 # bodies whose acceleration was evaluated before the last substep
+    system.pv += dt/2*pacc
+    for s in range(n_sub):
+        start = np.flatnonzero(s % period == 0) # bodies starting a time step
+        system.v[start] += (period[start]*h/2)[:, np.newaxis]*a[start]
+        system.r += h*system.v
+        system.pr += h*system.pv
+        system.invalidate()
+        end = np.flatnonzero((s + 1) % period == 0) # bodies ending a time step
+        if s == n_sub - 1:
+            a, pacc = [x.copy() for x in system.accelerations()] # every body ends here
+        else:
+            a[end] = system.partial_accelerations(end)
+            evaluated += len(end)
+        system.v[end] += (period[end]*h/2)[:, np.newaxis]*a[end]
+    system.pv += dt/2*pacc
+    system.acc = (a, pacc) # forces at the end of the step are reused by the next one
+    # accelerations() counted the last substep already
+    system.force_evals += evaluated/n
+    system.force_evals_saved += (n*(n_sub - 1) - evaluated)/n
+
+INTEGRATORS = {'euler_cromer': euler_cromer, 'leapfrog': leapfrog,
+               'yoshida4': yoshida4, 'rk4': rk4, 'block': block}
+
+def compare_integrators(n_bodies = 9, scale = 30, t_end = 10, steps = (100, 300, 1000, 3000),
+                        seed = 0):
+    # energy error versus number of force evaluations, for every integrator
+    # returns a list of (integrator, dt, force evaluations, relative energy error, wall time)
+    from solar_system import SolarSystem # solar_system imports this module
+    results = []
+    for name in INTEGRATORS:
+        for n_steps in steps:
+            np.random.seed(seed) # same initial conditions for every run
+            sol = SolarSystem(n_bodies, scale, softening = 0.1, integrator = name)
+            e0 = sol.energy()
+            dt = t_end/n_steps
+            t0 = time.perf_counter()
+            for i in range(n_steps):
+                sol.update(dt)
+            wall = time.perf_counter() - t0
+            error = np.abs((sol.energy() - e0)/e0)
+            results.append((name, dt, sol.force_evals, error, wall))
+    return results
+
+if __name__ == '__main__':
+    print('%-14s %10s %10s %12s %10s' %('integrator', 'dt', 'evals', 'dE/E', 'time [s]'))
+    for name, dt, evals, error, wall in compare_integrators():
+        print('%-14s %10.4f %10d %12.3E %10.3f' %(name, dt, evals, error, wall))
@@ -0,0 +1,67 @@
+import numpy as np
+# closed-form two-body orbits, for planets that barely feel anything but the star
+
+MAX_ITER = 50 # Newton iterations for Kepler's equation
+TOL = 1e-12 # convergence tolerance for Kepler's equation
+
+class KeplerOrbits:
+    def __init__(self, n):
+        '''
+        Bound two-body orbits of n bodies, relative to a central body.
+        Each orbit is stored as its relative state (r0, v0) at epoch t0, and
+        can be evaluated at any time t with the f and g functions, written in
+        terms of the change in eccentric anomaly (works for circular orbits).
+        '''
+        self.r0 = np.zeros((n, 2)) # relative position at epoch
+        self.v0 = np.zeros((n, 2)) # relative velocity at epoch
+        self.t0 = np.zeros(n) # epoch
+        self.mu = np.ones(n) # G*(M + m)
+        self.a = np.ones(n) # semimajor axis
+        self.mean_motion = np.ones(n)
+        self.s = np.zeros(n) # e*sin(E0)
+        self.c = np.zeros(n) # e*cos(E0)
+
+    def fit(self, index, r0, v0, mu, t0):
+        # set orbits of bodies index from their relative state at time t0
+        r = np.linalg.norm(r0, axis = -1)
+        a = 1/(2/r - np.sum(v0**2, axis = -1)/mu) # vis viva
+        self.r0[index] = r0
+        self.v0[index] = v0
+        self.t0[index] = t0
+        self.mu[index] = mu
+        self.a[index] = a
+        self.mean_motion[index] = np.sqrt(mu/a**3)
+        self.s[index] = np.sum(r0*v0, axis = -1)/np.sqrt(mu*a)
+        self.c[index] = 1 - r/a
+
+    def state_at(self, t, index):
+        # relative positions and velocities of bodies index at time t
+        a = self.a[index]
+        n = self.mean_motion[index]
+        s = self.s[index]
+        c = self.c[index]
+        r0 = self.r0[index]
+        v0 = self.v0[index]
+        period = 2*np.pi/n
+        dt = np.mod(t - self.t0[index], period) # orbits are periodic
+        mean_anomaly = n*dt
+
+        # solve n*dt = x + s*(1 - cos x) - c*sin x for x, the change in
+        # eccentric anomaly, with Newton's method
+        x = mean_anomaly.copy()
+        for i in range(MAX_ITER):
+            f = x + s*(1 - np.cos(x)) - c*np.sin(x) - mean_anomaly
+            dx = f/(1 + s*np.sin(x) - c*np.cos(x))
+            x = x - dx
+            if np.all(np.abs(dx) < TOL):
+                break
+
+        r0_norm = a*(1 - c)
+        r_norm = a*(1 - c*np.cos(x) + s*np.sin(x))
+        f = 1 - a/r0_norm*(1 - np.cos(x))
+        g = dt - (x - np.sin(x))/n
+        fdot = -np.sqrt(self.mu[index]*a)*np.sin(x)/(r_norm*r0_norm)
+        gdot = 1 - a/r_norm*(1 - np.cos(x))
+        r = f[:, np.newaxis]*r0 + g[:, np.newaxis]*v0
+        v = fdot[:, np.newaxis]*r0 + gdot[:, np.newaxis]*v0
+        return r, v
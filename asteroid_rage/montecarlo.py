@@ -0,0 +1,171 @@
+import os
+import json
+import time
+import argparse
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from solar_system import StudentSolarSystem
+from simulation import Simulation, PHYSICS_DT, THRUST, FLOW_RATE, EAT_DISTANCE, DRY_MASS, DM
+# Monte Carlo sweeps over seeded scenarios, spread over many processes
+
+# per-run summary columns, and their types
+COLUMNS = {'seed': np.int64, 'steps': np.int64, 'energy_drift': np.float64,
+           'closest_approach': np.float64, 'bodies_consumed': np.int64,
+           'fuel': np.float64, 'wall_time': np.float64}
+
+# the type of each default is the type of its command line option
+DEFAULTS = {'n_bodies': 9, 'scale': 30.0, 'steps': 2000, 'dt': PHYSICS_DT,
+            'integrator': 'leapfrog', 'softening': 0.0, 'root_seed': 0,
+            'thrust': THRUST, 'flow_rate': FLOW_RATE, 'eat_distance': float(EAT_DISTANCE),
+            'dry_mass': DRY_MASS, 'dm': DM}
+
+class ColumnWriter:
+    def __init__(self, path, columns = COLUMNS):
+        '''
+        Append-only columnar storage: a directory with one raw binary file per
+        column, plus schema.json. Rows are appended as they arrive, so nothing
+        is held in memory, and a crashed run keeps everything written so far.
+        Opening an existing directory cuts all columns to the rows that every
+        column has, so a row that was only partly written before a crash
+        can't shift the columns against each other.
+        '''
+        self.path = path
+        self.columns = columns
+        os.makedirs(path, exist_ok = True)
+        self.truncate_rows()
+        with open(os.path.join(path, 'schema.json'), 'w') as f:
+            json.dump({name: np.dtype(dtype).str for name, dtype in columns.items()}, f)
+        self.files = {name: open(os.path.join(path, name + '.bin'), 'ab')
+                      for name in columns}
+
+    def truncate_rows(self):
+        # cut every existing column file to the common number of complete rows
+        files = {name: os.path.join(self.path, name + '.bin') for name in self.columns}
+        sizes = {name: os.path.getsize(f) for name, f in files.items() if os.path.exists(f)}
+        if not sizes:
+            return
+        itemsize = {name: np.dtype(dtype).itemsize for name, dtype in self.columns.items()}
+        n = min(sizes.get(name, 0)//itemsize[name] for name in self.columns)
+        for name, size in sizes.items():
+            if size != n*itemsize[name]:
+                os.truncate(files[name], n*itemsize[name])
+
+    def append(self, rows):
+        # rows: list of dicts with one entry per column
+        for name, dtype in self.columns.items():
+            np.array([row[name] for row in rows], dtype = dtype).tofile(self.files[name])
+            self.files[name].flush()
+
+    def close(self):
+        for f in self.files.values():
+            f.close()
+
+def read_columns(path):
+    # read a ColumnWriter directory back as a dict of arrays
+    with open(os.path.join(path, 'schema.json')) as f:
+        schema = json.load(f)
+    data = {name: np.fromfile(os.path.join(path, name + '.bin'), dtype = dtype)
+            for name, dtype in schema.items()}
+    n = min(len(col) for col in data.values()) # drop a partly written last row
+    return {name: col[:n] for name, col in data.items()}
+
+def autopilot(sol, dt, config):
+    # stand-in for a player: fly towards the nearest body, and eat it when in range
+    # returns distance to the nearest surface, and whether a body was consumed
+    dist = np.linalg.norm(sol.r[1:], axis = 1) - sol.radius[1:] # player is at the origin
+    target = np.argmin(dist) + 1
+    if dist[target - 1] < config['eat_distance']:
+        return dist[target - 1], sol.convert_to_fuel(target, config['dm'])
+    if sol.m[0] > config['dry_mass']:
+        direction = sol.r[target]/np.linalg.norm(sol.r[target])
+        sol.v[0] = sol.v[0] + direction*config['thrust']/sol.m[0]*dt
+        sol.m[0] = sol.m[0] - config['flow_rate']*dt
+    return dist[target - 1], False
+
+def run_scenario(seed, config):
+    # one seeded headless game; returns its summary row
+    t0 = time.perf_counter()
+    # every run gets its own random stream, independent of which worker runs it
+    rng = np.random.default_rng([config['root_seed'], seed])
+    sol = StudentSolarSystem(config['n_bodies'], config['scale'], softening = config['softening'],
+                             integrator = config['integrator'], rng = rng)
+    sim = Simulation(sol, config['dt'])
+    energy_drift = 0 # accumulated energy error of the physics steps only
+    closest = np.inf
+    consumed = 0
+    for step in range(config['steps']):
+        if len(sol.r) == 1:
+            break # everything eaten
+        e0 = sol.energy()
+        sim.step()
+        energy_drift += (sol.energy() - e0)/abs(e0)
+        dist, eaten = autopilot(sol, config['dt'], config)
+        closest = min(closest, dist)
+        consumed += eaten
+    return {'seed': seed, 'steps': sim.steps, 'energy_drift': energy_drift,
+            'closest_approach': closest, 'bodies_consumed': consumed,
+            'fuel': sol.m[0] - config['dry_mass'], 'wall_time': time.perf_counter() - t0}
+
+def run_chunk(seeds, config):
+    return [run_scenario(seed, config) for seed in seeds]
+
+def run_sweep(path, seeds, config, workers = None, chunk_size = 8):
+    # run all seeds on a process pool, appending summaries to path as chunks finish
+    # seeds already stored in path are skipped, so an interrupted sweep can be resumed;
+    # the config is stored with the results, and resuming with a different one is refused
+    config_path = os.path.join(path, 'config.json')
+    if os.path.exists(os.path.join(path, 'schema.json')):
+        stored = None
+        if os.path.exists(config_path):
+            with open(config_path) as f:
+                stored = json.load(f)
+        if stored != json.loads(json.dumps(config)):
+            changed = sorted(name for name in set(config) | set(stored or {})
+                             if (stored or {}).get(name) != config.get(name))
+            raise ValueError('%s holds a sweep with a different config (%s); '
+                             'use a new output directory' %(path, ', '.join(changed)))
+        done = set(read_columns(path)['seed'].tolist())
+        seeds = [seed for seed in seeds if seed not in done]
+    chunks = [seeds[i:i + chunk_size] for i in range(0, len(seeds), chunk_size)]
+    writer = ColumnWriter(path)
+    with open(config_path, 'w') as f:
+        json.dump(config, f)
+    workers = workers or os.cpu_count()
+    n_done = 0
+    try:
+        with ProcessPoolExecutor(workers) as pool:
+            pending = set()
+            while chunks or pending:
+                # keep a bounded number of chunks in flight
+                while chunks and len(pending) < 2*workers:
+                    pending.add(pool.submit(run_chunk, chunks.pop(0), config))
+                finished, pending = wait(pending, return_when = FIRST_COMPLETED)
+                for future in finished:
+                    rows = future.result()
+                    writer.append(rows)
+                    n_done += len(rows)
+                print('%d/%d runs done' %(n_done, len(seeds)), end = '\r', flush = True)
+    finally:
+        writer.close()
+    print()
+    return n_done
+
+def parse_args(argv = None):
+    parser = argparse.ArgumentParser(description = 'Monte Carlo sweep over seeded asteroid_rage scenarios')
+    parser.add_argument('out', help = 'output directory, one binary file per column')
+    parser.add_argument('--runs', type = int, default = 100, help = 'number of seeds')
+    parser.add_argument('--first-seed', type = int, default = 0)
+    parser.add_argument('--workers', type = int, default = None, help = 'default: all cores')
+    parser.add_argument('--chunk', type = int, default = 8, help = 'seeds per task')
+    for name, value in DEFAULTS.items():
+        parser.add_argument('--' + name.replace('_', '-'), type = type(value), default = value)
+    return parser.parse_args(argv)
+
+if __name__ == '__main__':
+    args = parse_args()
+    config = {name: getattr(args, name) for name in DEFAULTS}
+    seeds = list(range(args.first_seed, args.first_seed + args.runs))
+    t0 = time.perf_counter()
+    n = run_sweep(args.out, seeds, config, args.workers, args.chunk)
+    print('%d runs in %.1f s' %(n, time.perf_counter() - t0))
@@ -0,0 +1,103 @@
+import json
+import time
+import numpy as np
+# lightweight per-stage timing, with rolling percentiles
+
+WINDOW = 600 # samples kept per stage, 5 seconds at 120 Hz
+
+class Stage:
+    # context manager timing one stage; one per stage name, reused every frame
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.profiler.record(self.name, time.perf_counter() - self.t0)
+
+class NullStage:
+    # does nothing, for code that is not being profiled
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *exc):
+        pass
+
+class NullProfiler:
+    stage_ = NullStage()
+    def stage(self, name):
+        return self.stage_
+
+NULL_PROFILER = NullProfiler()
+
+class FrameProfiler:
+    def __init__(self, window = WINDOW):
+        '''
+        Times named stages of a frame, e.g.
+            with profiler.stage('physics'):
+                sim.advance(dt)
+        or, for a loop that runs one stage after another,
+            profiler.start()
+            ...
+            profiler.lap('capture') # time since start(), or the previous lap
+        The last window durations of each stage are kept in a ring buffer,
+        so percentiles always describe recent frames. Stages may be nested.
+        '''
+        self.window = window
+        self.stages = {} # name: Stage
+        self.samples = {} # name: ring buffer of durations [s]
+        self.count = {} # name: number of samples recorded so far
+        self.t_lap = time.perf_counter()
+
+    def stage(self, name):
+        if name not in self.stages:
+            self.stages[name] = Stage(self, name)
+            self.samples[name] = np.zeros(self.window)
+            self.count[name] = 0
+        return self.stages[name]
+
+    def start(self):
+        self.t_lap = time.perf_counter()
+
+    def lap(self, name):
+        # the time since the previous lap (or start) is a sample of stage name
+        now = time.perf_counter()
+        self.stage(name)
+        self.record(name, now - self.t_lap)
+        self.t_lap = now
+
+    def record(self, name, seconds):
+        self.samples[name][self.count[name] % self.window] = seconds
+        self.count[name] += 1
+
+    def recent(self, name):
+        # the samples currently in the window
+        return self.samples[name][:min(self.count[name], self.window)]
+
+    def summary(self):
+        # p50, p95, p99 and mean of every stage, in milliseconds
+        summary = {}
+        for name in self.samples:
+            recent = self.recent(name)*1e3
+            if len(recent) == 0:
+                continue
+            p50, p95, p99 = np.percentile(recent, [50, 95, 99])
+            summary[name] = {'p50': p50, 'p95': p95, 'p99': p99,
+                             'mean': np.mean(recent), 'count': self.count[name]}
+        return summary
+
+    def report(self):
+        # summary as text, one line per stage
+        lines = ['%-10s %6s %6s %6s' %('[ms]', 'p50', 'p95', 'p99')]
+        for name, s in self.summary().items():
+            lines.append('%-10s %6.2f %6.2f %6.2f' %(name, s['p50'], s['p95'], s['p99']))
+        return '\n'.join(lines)
+
+    def dump(self, filename):
+        # write summary and raw recent samples [ms] to a JSON file, for comparing builds
+        data = {'summary': self.summary(),
+                'samples': {name: (self.recent(name)*1e3).tolist() for name in self.samples}}
+        with open(filename, 'w') as f:
+            json.dump(data, f, indent = 1)
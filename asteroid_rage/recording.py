@@ -0,0 +1,164 @@
+import os
+import numpy as np
+# recording of simulation states to a memory mapped file, and replay from it
+
+MAGIC = b'ASTREC'
+VERSION = 1
+HEADER_SIZE = 64 # bytes reserved for the header, records start after it
+HEADER = np.dtype([('magic', 'S6'), ('version', '<u2'), ('capacity', '<u4'),
+                   ('n_particles', '<u4'), ('max_steps', '<u8'), ('steps', '<u8'), ('dt', '<f8')])
+# player inputs, bit i of the inputs mask is INPUTS[i]
+INPUTS = ('boost', 'left', 'right', 'consume', 'zoom_in', 'zoom_out', 'slower', 'faster')
+
+def record_dtype(capacity, n_particles):
+    # one record per physics step; bodies past n are unused
+    return np.dtype([('time', '<f8'), ('n', '<i4'), ('inputs', '<u4'), ('rotation', '<f8'),
+                     ('ids', '<i8', (capacity,)), ('r', '<f8', (capacity, 2)),
+                     ('v', '<f8', (capacity, 2)), ('m', '<f8', (capacity,)),
+                     ('radius', '<f8', (capacity,)),
+                     ('pr', '<f4', (n_particles, 2))]) # particles are only drawn
+
+def inputs_mask(pressed):
+    # bitmask of a sequence of booleans, one per name in INPUTS
+    return sum(1 << i for i, down in enumerate(pressed) if down)
+
+class Recorder:
+    def __init__(self, filename, sol, max_steps, dt):
+        '''
+        Records the state of sol after every physics step into filename,
+        which is preallocated for max_steps records and memory mapped, so
+        recording allocates nothing and only touches the pages it writes.
+        If more steps come, the file doubles in size; no step is dropped.
+        rotation and inputs (see INPUTS) are recorded with each step; set them
+        to the player's rotation and inputs before stepping.
+        dt: physics time step [yr], stored in the header
+        '''
+        self.capacity = sol.store.capacity
+        self.n_particles = len(sol.pr)
+        self.dtype = record_dtype(self.capacity, self.n_particles)
+        self.filename = filename
+        size = HEADER_SIZE + max_steps*self.dtype.itemsize
+        with open(filename, 'wb') as f:
+            f.truncate(size) # sparse file, disk space is used as records are written
+        self.header = np.memmap(filename, HEADER, 'r+', 0, ())
+        self.header['magic'] = MAGIC
+        self.header['version'] = VERSION
+        self.header['capacity'] = self.capacity
+        self.header['n_particles'] = self.n_particles
+        self.header['max_steps'] = max_steps
+        self.header['dt'] = dt
+        self.max_steps = max_steps
+        self.map()
+        self.steps = 0
+        self.rotation = 0
+        self.inputs = 0
+
+    def map(self):
+        self.records = np.memmap(self.filename, self.dtype, 'r+', HEADER_SIZE, (self.max_steps,))
+        # the fields of all records, so writing a step is plain slice assignment
+        self.fields = {name: self.records[name] for name in self.dtype.names}
+
+    def grow(self):
+        # preallocate twice the steps, when the recording is full
+        self.records.flush()
+        del self.records, self.fields
+        self.max_steps *= 2
+        os.truncate(self.filename, HEADER_SIZE + self.max_steps*self.dtype.itemsize)
+        self.header['max_steps'] = self.max_steps
+        self.map()
+
+    def record(self, sol):
+        # append the current state of sol
+        if self.steps == self.max_steps:
+            self.grow()
+        k, n, f = self.steps, sol.store.n, self.fields
+        f['time'][k] = sol.t
+        f['n'][k] = n
+        f['inputs'][k] = self.inputs
+        f['rotation'][k] = self.rotation
+        f['ids'][k, :n] = sol.store.ids[:n]
+        f['r'][k, :n] = sol.r
+        f['v'][k, :n] = sol.v
+        f['m'][k, :n] = sol.m
+        f['radius'][k, :n] = sol.radius
+        f['pr'][k] = sol.pr
+        self.steps += 1
+        self.header['steps'] = self.steps # readable even if we never get to close()
+
+    def close(self):
+        # flush, and cut the file down to the steps actually recorded
+        self.records.flush()
+        self.header.flush()
+        del self.records, self.fields, self.header
+        os.truncate(self.filename, HEADER_SIZE + self.steps*self.dtype.itemsize)
+
+class Recording:
+    def __init__(self, filename):
+        '''
+        Read-only view of a file written by Recorder. Records are memory mapped,
+        so any step can be read at once (random seeking) without loading the
+        file, e.g. recording.state(step)['r'], or recording.records['m'][:, 0]
+        for the player mass over the whole run.
+        '''
+        header = np.memmap(filename, HEADER, 'r', 0, ())
+        if header['magic'] != MAGIC or header['version'] != VERSION:
+            raise ValueError(f'{filename} is not an asteroid_rage recording (version {VERSION})')
+        self.capacity = int(header['capacity'])
+        self.n_particles = int(header['n_particles'])
+        self.steps = int(header['steps'])
+        self.dt = float(header['dt'])
+        self.records = np.memmap(filename, record_dtype(self.capacity, self.n_particles),
+                                 'r', HEADER_SIZE, (self.steps,))
+        self.extra = {} # store columns not in the recording, by body id (see load)
+        self.objects = {} # store objects (e.g. sprites), by body id
+
+    def __len__(self):
+        return self.steps
+
+    @property
+    def time(self):
+        # simulation time of every step [yr]
+        return self.records['time']
+
+    def seek(self, t):
+        # the first step at or after simulation time t
+        return min(int(np.searchsorted(self.time, t)), self.steps - 1)
+
+    def state(self, step):
+        # the recorded state of step, as arrays with one row per active body
+        record = self.records[step]
+        n = int(record['n'])
+        state = {name: record[name][:n] for name in ('ids', 'r', 'v', 'm', 'radius')}
+        state.update(time = float(record['time']), inputs = int(record['inputs']),
+                     rotation = float(record['rotation']), pr = record['pr'])
+        return state
+
+    def load(self, step, sol):
+        # put the recorded state of step into sol, e.g. to draw it or to resume from it
+        # store columns that are not recorded (like the renderer's), and objects,
+        # follow the bodies by id; they are taken from sol as it is on each load,
+        # so load into a system that still has all its bodies first
+        store = sol.store
+        if store.capacity != self.capacity or len(sol.pr) != self.n_particles:
+            raise ValueError(f'recording holds {self.capacity} bodies and {self.n_particles} particles, '
+                             f'but the system holds {store.capacity} and {len(sol.pr)}')
+        state = self.state(step)
+        ids, n = state['ids'], len(state['ids'])
+        for name in store.data:
+            if name not in state:
+                extra = self.extra.setdefault(name, np.zeros_like(store.data[name]))
+                extra[store.ids[:store.n]] = store.view(name)
+        self.objects.update(zip(store.ids[:store.n], store.objects))
+        store.slot_of[store.ids[:store.n]] = -1
+        store.n = n
+        store.ids[:n] = ids
+        store.slot_of[ids] = np.arange(n)
+        for name in store.data:
+            store.view(name)[...] = state[name] if name in state else self.extra[name][ids]
+        store.objects[:n] = [self.objects.get(i) for i in ids]
+        store.objects[n:] = [None]*(store.capacity - n)
+        sol.pr[...] = state['pr']
+        sol.t = state['time']
+        sol.reset_kepler()
+        sol.invalidate()
+        return state
@@ -0,0 +1,87 @@
+import numpy as np
+import pyglet
+from pyglet import gl
+# draws all bodies from one vertex list, instead of one sprite per body
+
+class BlendedTextureGroup(pyglet.graphics.TextureGroup):
+    # texture group with alpha blending, like pyglet's sprites
+    def set_state(self):
+        super().set_state()
+        gl.glEnable(gl.GL_BLEND)
+        gl.glBlendFunc(gl.GL_SRC_ALPHA, gl.GL_ONE_MINUS_SRC_ALPHA)
+
+    def unset_state(self):
+        gl.glDisable(gl.GL_BLEND)
+        super().unset_state()
+
+class BodyRenderer:
+    def __init__(self, store, texture, width, height, batch, group = None):
+        '''
+        Bulk renderer for the bodies of a BodyStore: every body is a textured
+        quad in a single vertex list, and all quads are written in one NumPy
+        pass per frame. Bodies outside the viewport are culled (collapsed to
+        an empty quad).
+        store: BodyStore of the solar system; size, aspect, rotation and texture
+        coordinates become columns of it, so they follow bodies that are moved
+        when others are removed
+        texture: texture holding the images of all bodies (e.g. an atlas)
+        width, height: viewport size in pixels
+        '''
+        self.store = store
+        self.width = width
+        self.height = height
+        store.add_column('size', (), float) # width on screen at zoom 1 [pixels], 0 = hidden
+        store.add_column('aspect', (), float) # height/width of the image
+        store.add_column('rotation', (), float) # degrees, clockwise like pyglet sprites
+        store.add_column('tex', (4, 3), float) # texture coordinates of the quad corners
+        self.vertices = np.zeros((store.capacity, 4, 2), dtype = np.float32)
+        self.tex = np.zeros((store.capacity, 4, 3), dtype = np.float32)
+        self.vertex_list = batch.add(4*store.capacity, gl.GL_QUADS,
+                                     BlendedTextureGroup(texture, parent = group),
+                                     ('v2f/stream', self.vertices.ravel()),
+                                     ('t3f/dynamic', self.tex.ravel()))
+        self.n_drawn = -1 # number of bodies when texture coordinates were last written
+
+    def set_body(self, slot, region, size, rotation = 0):
+        # draw body in slot with the image region (of texture), size pixels wide at zoom 1
+        self.store.data['size'][slot] = size
+        self.store.data['aspect'][slot] = region.height/region.width
+        self.store.data['rotation'][slot] = rotation
+        self.store.data['tex'][slot] = np.reshape(region.tex_coords, (4, 3))
+        self.n_drawn = -1
+
+    def update(self, screen_coordinates, zoom = 1, sizes = None):
+        # write all quads for this frame; screen_coordinates are the body centres
+        # sizes: new widths at zoom 1 [pixels], for bodies that grew or shrank (e.g.
+        # merged or partly eaten); 0 hides a body. Default: the sizes set so far
+        n = self.store.n
+        if sizes is not None:
+            self.store.view('size')[:] = sizes
+        half_w = self.store.view('size')*zoom/2
+        half_h = half_w*self.store.view('aspect')
+        x = screen_coordinates[:, 0]
+        y = screen_coordinates[:, 1]
+        reach = np.hypot(half_w, half_h)
+        visible = (half_w > 0) & (x + reach > 0) & (x - reach < self.width)\
+                  & (y + reach > 0) & (y - reach < self.height)
+
+        # corners: bottom left, bottom right, top right, top left, then rotated
+        theta = -np.radians(self.store.view('rotation'))
+        cos, sin = np.cos(theta), np.sin(theta)
+        corner_x = np.array([-1, 1, 1, -1])*half_w[:, np.newaxis]
+        corner_y = np.array([-1, -1, 1, 1])*half_h[:, np.newaxis]
+        quads = self.vertices[:n]
+        quads[..., 0] = x[:, np.newaxis] + cos[:, np.newaxis]*corner_x - sin[:, np.newaxis]*corner_y
+        quads[..., 1] = y[:, np.newaxis] + sin[:, np.newaxis]*corner_x + cos[:, np.newaxis]*corner_y
+        quads[~visible] = 0 # culled: empty quad
+        self.vertices[n:] = 0 # removed bodies
+        np.ctypeslib.as_array(self.vertex_list.vertices)[:] = self.vertices.ravel()
+
+        if n != self.n_drawn:
+            # bodies were added, moved or removed: rewrite texture coordinates
+            self.tex[:n] = self.store.view('tex')
+            np.ctypeslib.as_array(self.vertex_list.tex_coords)[:] = self.tex.ravel()
+            self.n_drawn = n
+
+    def delete(self):
+        self.vertex_list.delete()
@@ -0,0 +1,130 @@
+import time
+import argparse
+import numpy as np
+
+from solar_system import StudentSolarSystem
+from profiler import NULL_PROFILER, FrameProfiler
+from recording import Recorder
+# fixed time step simulation loop, usable with or without a game window
+
+PHYSICS_DT = 1/100 # physics time step [yr]
+MAX_STEPS = 50 # most physics steps per frame, so slow frames can't snowball
+
+# game rules, shared by the game and headless runs
+THRUST = 1e-4 # units?!
+FLOW_RATE = 1e-5 # units!
+EAT_DISTANCE = 1 # AU, maximum distance at which planet is consumed
+DRY_MASS = 1e-5 # mass of space ship without fuel (solar masses)
+DM = 1e-4 # rate at which objects are consumed
+
+class Simulation:
+    def __init__(self, sol, dt = PHYSICS_DT, max_steps = MAX_STEPS, profiler = NULL_PROFILER,
+                 recorder = None):
+        '''
+        Advances a solar system with a fixed time step, independent of frame rate
+        sol: SolarSystem (or StudentSolarSystem) to advance
+        dt: physics time step [yr]
+        max_steps: most physics steps taken per call to advance
+        profiler: FrameProfiler timing each step (and the solar system's force evaluations)
+        recorder: recording.Recorder, which records the state after every step
+        '''
+        self.sol = sol
+        self.profiler = profiler
+        sol.profiler = profiler
+        self.recorder = recorder
+        self.dt = dt
+        self.max_steps = max_steps
+        self.accumulator = 0 # simulation time not simulated yet [yr]
+        self.steps = 0 # physics steps taken so far
+        # state before the latest step, for interpolating between steps
+        self.prev_r = sol.r.copy()
+        self.prev_pr = sol.pr.copy()
+
+    def step(self):
+        # take one physics step, remembering the previous positions
+        if self.prev_r.shape == self.sol.r.shape:
+            np.copyto(self.prev_r, self.sol.r)
+        else:
+            self.prev_r = self.sol.r.copy() # bodies were removed
+        np.copyto(self.prev_pr, self.sol.pr)
+        with self.profiler.stage('step'):
+            self.sol.update(self.dt)
+        self.steps += 1
+        if self.recorder is not None:
+            self.recorder.record(self.sol)
+
+    def advance(self, frame_time):
+        # simulate frame_time [yr] in fixed steps, leftover time is carried over
+        # returns the number of steps taken
+        self.accumulator += frame_time
+        n = 0
+        while self.accumulator >= self.dt and n < self.max_steps:
+            self.step()
+            self.accumulator -= self.dt
+            n += 1
+        if n == self.max_steps:
+            self.accumulator = min(self.accumulator, self.dt) # give up on catching up
+        return n
+
+    @property
+    def alpha(self):
+        # how far we are between the last two physics steps, in [0, 1)
+        return self.accumulator/self.dt
+
+    def positions(self):
+        # body positions interpolated between the last two steps, for rendering
+        if self.prev_r.shape != self.sol.r.shape:
+            return self.sol.r
+        return self.prev_r + self.alpha*(self.sol.r - self.prev_r)
+
+    def particle_positions(self):
+        # test particle positions interpolated between the last two steps
+        return self.prev_pr + self.alpha*(self.sol.pr - self.prev_pr)
+
+def run_headless(steps, n_bodies = 9, scale = 30, dt = PHYSICS_DT, profiler = NULL_PROFILER,
+                 record = None, **kwargs):
+    # run steps physics steps without a window, as fast as possible
+    # record: file to record every step to (see recording.py)
+    # kwargs are passed on to StudentSolarSystem; returns the simulation and steps/second
+    sol = StudentSolarSystem(n_bodies, scale, **kwargs)
+    recorder = Recorder(record, sol, steps, dt) if record else None
+    sim = Simulation(sol, dt, profiler = profiler, recorder = recorder)
+    t0 = time.perf_counter()
+    for i in range(steps):
+        sim.step()
+    wall = time.perf_counter() - t0
+    if recorder is not None:
+        recorder.close()
+    return sim, steps/wall
+
+def parse_args(argv = None):
+    parser = argparse.ArgumentParser(description = 'Run asteroid_rage physics without a window')
+    parser.add_argument('--steps', type = int, default = 1000, help = 'physics steps to run')
+    parser.add_argument('--bodies', type = int, default = 9, help = 'massive bodies, incl. player and star')
+    parser.add_argument('--particles', type = int, default = 0, help = 'massless test particles')
+    parser.add_argument('--scale', type = float, default = 30, help = 'size of solar system [AU]')
+    parser.add_argument('--dt', type = float, default = PHYSICS_DT, help = 'physics time step [yr]')
+    parser.add_argument('--gravity', default = 'direct', help = "'direct' or 'barnes_hut'")
+    parser.add_argument('--theta', type = float, default = 0.5, help = 'Barnes-Hut opening angle')
+    parser.add_argument('--softening', type = float, default = 0, help = 'softening length [AU]')
+    parser.add_argument('--integrator', default = 'euler_cromer', help = 'see integrators.py')
+    parser.add_argument('--hybrid', action = 'store_true', help = 'Kepler orbits for unperturbed planets')
+    parser.add_argument('--seed', type = int, default = None, help = 'random seed for initial conditions')
+    parser.add_argument('--profile', default = None, help = 'write per-stage timings to this JSON file')
+    parser.add_argument('--record', default = None, help = 'record every step to this file, see recording.py')
+    return parser.parse_args(argv)
+
+if __name__ == '__main__':
+    args = parse_args()
+    if args.seed is not None:
+        np.random.seed(args.seed)
+    profiler = FrameProfiler(args.steps) if args.profile else NULL_PROFILER
+    sim, rate = run_headless(args.steps, args.bodies, args.scale, args.dt, profiler, args.record,
+                             n_particles = args.particles, gravity = args.gravity,
+                             theta = args.theta, softening = args.softening,
+                             integrator = args.integrator, hybrid = args.hybrid)
+    print('%d steps, %d bodies, %d particles: %.1f steps/second'
+          %(args.steps, args.bodies, args.particles, rate))
+    if args.profile:
+        print(profiler.report())
+        profiler.dump(args.profile)
@@ -1,44 +1,268 @@
 import numpy as np
 import utils
+from kepler import KeplerOrbits
+from integrators import INTEGRATORS
+from body_store import BodyStore, column
+from profiler import NULL_PROFILER
 # Init constants
 G = 39.478 # AU^3/yr^-2 M_o^-1
+KEPLER_CHECK_STEPS = 10 # hybrid mode re-selects the bodies on Kepler orbits this often
 
 class SolarSystem:
-    def __init__(self, n_bodies, scale):
-        # Solar system with n_bodies in it
+    # body arrays are views of the active part of self.store
+    r = column('r') # positions
+    v = column('v') # velocities
+    m = column('m') # masses
+    rho = column('rho') # densities
+    radius = column('radius') # radii
+
+    def __init__(self, n_bodies, scale, softening = 0, gravity = 'direct', theta = 0.5,
+                 n_particles = 0, hybrid = False, kepler_threshold = 1e-3,
+                 integrator = 'euler_cromer', rng = None, capacity = None):
+        # Solar system with n_bodies in it, and n_particles massless test particles
+        # capacity: most bodies the system can ever hold, default n_bodies
+        # hybrid: bodies perturbed less than kepler_threshold (relative to the
+        # star's pull) move on closed-form Kepler orbits instead of being integrated
         self.n_bodies = n_bodies
+        self.n_particles = n_particles
         self.scale = scale # bounds of solar system, [AU]
         self.rf = 0 # select reference frame to be object 0, i.e. player
+        self.rng = np.random if rng is None else rng # e.g. np.random.default_rng(seed)
+        self.integrator = INTEGRATORS[integrator] # see integrators.py
+        self.softening = softening
+        # gravity backend, 'direct' (exact) or 'barnes_hut' (tree, for large fields)
+        self.gravity = make_gravity(gravity, softening, theta)
+        self.store = BodyStore(capacity or n_bodies,
+                               {'r': ((2,), float), 'v': ((2,), float), 'm': ((), float),
+                                'rho': ((), float), 'radius': ((), float)})
         r, v, m, rho = self.initialize_system()
-        self.r = r # positions
-        self.v = v # velocities
-        self.m = m # masses
-        self.rho = rho # densities
-        self.radius = (self.m/(self.rho*4/3*np.pi))**(1/3)*500 # radii
+        self.store.extend(r = r, v = v, m = m, rho = rho,
+                          radius = (m/(rho*4/3*np.pi))**(1/3)*500)
+        # test particles (debris) feel the massive bodies, but exert no force
+        self.particle_gravity = DirectGravity(softening)
+        self.pr, self.pv = self.initialize_particles(n_particles)
+        self.t = 0 # simulation time [yr]
+        self.hybrid = hybrid
+        self.kepler_threshold = kepler_threshold
+        self.reset_kepler()
+        self.acc = None # cached accelerations, valid until positions or masses change
+        self.force_evals = 0 # number of force evaluations so far
+        self.force_evals_saved = 0 # by block time steps and Kepler orbits, compared to global stepping
+        self.partial_gravity = None # for block time steps (see integrators.block) and hybrid mode
+        self.block_acc = None # (t, accelerations) at the start of the last block time step
+        self.profiler = NULL_PROFILER # e.g. profiler.FrameProfiler, times force evaluations
 
     def update(self, dt):
-        # Euler-Chromer for starters
-        acc = gravity_acc(self.r, self.m)
-        self.v = self.v + dt*acc
-        self.v = self.v - self.v[self.rf] # shift reference frame
-        self.r = self.r + self.v*dt - self.r[self.rf]
+        if self.hybrid:
+            self.select_kepler()
+        self.t_drift = self.t # time of the positions, advanced by drift()
+        self.integrator(self, dt)
+        # shift reference frame; particles follow the same reference frame
+        v_rf = self.v[self.rf].copy()
+        r_rf = self.r[self.rf].copy()
+        self.v -= v_rf
+        self.pv -= v_rf
+        self.r -= r_rf
+        self.pr -= r_rf
+        self.t += dt
+        if self.integrated is not None:
+            self.update_kepler()
+
+    def accelerations(self):
+        # accelerations of bodies and test particles at the current positions
+        # in hybrid mode, only integrated bodies get forces; bodies on Kepler orbits get none
+        # the arrays are the kernels' buffers, valid until the next evaluation
+        if self.acc is None:
+            with self.profiler.stage('gravity'):
+                if self.integrated is None:
+                    acc = self.gravity(self.r, self.m)
+                    fraction = 1
+                else:
+                    acc = self.kepler_acc
+                    acc[self.integrated] = self.partial_accelerations(self.integrated)
+                    fraction = len(self.integrated)/len(self.r)
+                pacc = self.particle_gravity.field(self.pr, self.r, self.m)
+            self.acc = (acc, pacc)
+            self.force_evals += fraction
+            self.force_evals_saved += 1 - fraction
+        return self.acc
+
+    def partial_accelerations(self, index):
+        # accelerations of bodies index only, due to all bodies
+        # always direct summation, O(len(index)*N), whatever the gravity backend
+        if self.partial_gravity is None:
+            self.partial_gravity = DirectGravity(self.softening)
+        return self.partial_gravity.field(self.r[index], self.r, self.m)
+
+    def jerk(self, index = None):
+        # time derivative of the accelerations (of bodies index), used to choose time steps
+        return gravity_jerk(self.r, self.v, self.m, self.softening, index)
+
+    def invalidate(self):
+        # positions or masses changed outside of the integrator
+        self.acc = None
+
+    def kick(self, dt):
+        # update velocities with the current accelerations
+        acc, pacc = self.accelerations()
+        self.v += dt*acc
+        self.pv += dt*pacc
+
+    def drift(self, dt):
+        # update positions with the current velocities
+        self.r += dt*self.v
+        self.pr += dt*self.pv
+        if self.integrated is not None:
+            # bodies on Kepler orbits go to their analytic positions instead, so
+            # forces evaluated after the drift are right for the end of the step
+            self.t_drift += dt
+            r_rel, v_rel = self.kepler.state_at(self.t_drift, self.kepler_index)
+            self.r[self.kepler_index] = self.r[self.star] + r_rel
+        self.invalidate()
+
+    def get_state(self):
+        return self.r, self.v, self.pr, self.pv
+
+    def set_state(self, r, v, pr, pv):
+        self.r, self.v, self.pr, self.pv = r, v, pr, pv
+        self.invalidate()
+
+    def energy(self):
+        # total energy of the massive bodies, in their centre of mass frame
+        # (the player-centred frame is not inertial, so energy is not conserved there)
+        v_cm = np.sum(self.m[:, np.newaxis]*self.v, axis = 0)/np.sum(self.m)
+        kinetic = 0.5*np.sum(self.m*np.sum((self.v - v_cm)**2, axis = -1))
+        d = self.r - self.r[:, np.newaxis]
+        dist = np.sqrt(np.sum(d**2, axis = -1) + self.softening**2)
+        i, j = np.triu_indices(len(self.r), 1)
+        potential = -G*np.sum(self.m[i]*self.m[j]/dist[i, j])
+        return kinetic + potential
+
+    @property
+    def ids(self):
+        # stable ids of the active bodies, unchanged when other bodies are removed
+        return self.store.ids[:self.store.n]
+
+    @property
+    def objects(self):
+        # Python objects attached to the active bodies (e.g. sprites), aligned with r
+        return self.store.objects[:self.store.n]
+
+    def remove(self, index):
+        # remove body index; the last body takes its place, returns the removed id
+        removed = self.store.remove(index)
+        self.invalidate()
+        if self.hybrid:
+            self.reset_kepler() # body indices changed
+        return removed
+
+    def reset_kepler(self):
+        # forget all Kepler orbits, e.g. when bodies are added or removed
+        self.kepler = KeplerOrbits(len(self.r))
+        self.on_kepler = np.zeros(len(self.r), dtype = bool)
+        self.kepler_index = np.flatnonzero(self.on_kepler)
+        self.star = 0
+        self.integrated = None # bodies that are integrated, None = all of them
+        self.steps_to_check = 0 # steps until the Kepler bodies are selected again
+        self.invalidate()
+
+    def select_kepler(self):
+        # every KEPLER_CHECK_STEPS steps, choose the bodies that move on Kepler orbits
+        # until the next check; the check needs the forces on all bodies
+        if self.steps_to_check > 0:
+            self.steps_to_check -= 1
+            return
+        if self.integrated is not None:
+            self.integrated = None
+            self.invalidate()
+        candidates, self.star = self.kepler_candidates(self.accelerations()[0])
+        self.on_kepler = candidates
+        self.kepler_index = np.flatnonzero(candidates)
+        if len(self.kepler_index) > 0:
+            self.integrated = np.flatnonzero(~candidates)
+            self.kepler_acc = np.zeros_like(self.r)
+        self.steps_to_check = KEPLER_CHECK_STEPS - 1
+
+    def kepler_candidates(self, acc):
+        # find bodies whose motion relative to the star is (nearly) a two-body orbit
+        if len(self.on_kepler) != len(self.r):
+            self.reset_kepler()
+        star = np.argmax(self.m) # dominant body
+        r_rel = self.r - self.r[star]
+        v_rel = self.v - self.v[star]
+        mu = G*(self.m[star] + self.m)
+        dist = np.linalg.norm(r_rel, axis = -1)
+        dist[star] = np.inf
+        kepler_acc = -mu[:, np.newaxis]*r_rel/dist[:, np.newaxis]**3
+        # perturbation: everything except the star's pull, relative to the star's pull
+        with np.errstate(invalid = 'ignore'): # 0/0 for the star itself
+            perturbation = np.linalg.norm(acc - acc[star] - kepler_acc, axis = -1)\
+                           /np.linalg.norm(kepler_acc, axis = -1)
+        bound = 0.5*np.sum(v_rel**2, axis = -1) - mu/dist < 0
+        candidates = (perturbation < self.kepler_threshold) & bound
+        candidates[[star, self.rf]] = False # star and player are always integrated
+        # fit orbits to bodies that were integrated until now
+        new = np.flatnonzero(candidates & ~self.on_kepler)
+        self.kepler.fit(new, r_rel[new], v_rel[new], mu[new], self.t)
+        return candidates, star
+
+    def update_kepler(self):
+        # move bodies on Kepler orbits to their analytic state at time t
+        index = self.kepler_index
+        r_rel, v_rel = self.kepler.state_at(self.t, index)
+        self.r[index] = self.r[self.star] + r_rel
+        self.v[index] = self.v[self.star] + v_rel
+        # drift() already put them there, unless the integrator moved bodies without
+        # it (rk4, block); then the cached forces are for the wrong positions
+        if not np.isclose(self.t_drift, self.t):
+            self.invalidate()
 
     def initialize_system(self):
         # Generate initial positions r0, velocities v0, and masses m0
-        r0 = np.random.uniform((-self.scale, -self.scale),\
-                               (self.scale, self.scale), (self.n_bodies, 2))
-        m0 = np.random.uniform(1e-6, 1e-2, self.n_bodies)   # solar masses
-        rho = np.random.uniform(1e6, 1e7, self.n_bodies) # solar masses/au^3
-        rho[1] = 2.3e6  # mean solar density, solar masses/au^3
-
-        # Assign player to index 0, sun to index 1, and other bodies after
-        r0[0] = np.array([self.scale, 0])
-        m0[1] = 1 # mass in solar masses
-        m0[0] = 1e-4
-        v0 = vis_viva(r0) # elliptical orbits, semimajor axis given by r0
-        r0[1] = 0 # initialize sun at centre
-        v0[1] = 0 # sun at rest in centre of system
-        return r0, v0, m0, rho
+        return initial_conditions(self.rng, self.scale, (self.n_bodies,))
+
+    def initialize_particles(self, n_particles):
+        # Generate circular orbits around the sun for n_particles test particles
+        a = self.rng.uniform(0.1*self.scale, self.scale, n_particles) # orbit radii
+        phi = self.rng.uniform(0, 2*np.pi, n_particles)
+        pr = a[:, np.newaxis]*np.stack((np.cos(phi), np.sin(phi)), axis = -1)
+        pv = vis_viva(pr)
+        return pr + self.r[1], pv + self.v[1] # relative to sun
+
+class StudentSolarSystem(SolarSystem):
+    def convert_to_fuel(self, id, dm):
+        # removes body no. id from arrays r,v and m, and adds its mass to player
+        # the last body is moved into slot id (see BodyStore.remove)
+        after_mass = self.m[id] - dm
+        if after_mass < 0:
+            self.m[0] = self.m[0] + self.m[id]
+            self.remove(id)
+            consumed = True
+        else:
+            self.m[0] = self.m[0] + dm
+            self.m[id] = self.m[id] - dm
+            self.radius[id] = (self.m[id]/(self.rho[id]*4/3*np.pi))**(1/3)*200 # radii
+            self.radius[0] = (self.m[0]/(self.rho[0]*4/3*np.pi))**(1/3)*200 # radii
+            consumed = False
+        self.invalidate() # masses (and maybe positions) changed
+        return consumed
+
+def initial_conditions(rng, scale, shape):
+    # random initial positions, velocities, masses and densities of bodies
+    # shape: (n_bodies,), or (n_systems, n_bodies) for an ensemble of systems
+    r0 = rng.uniform((-scale, -scale), (scale, scale), shape + (2,))
+    m0 = rng.uniform(1e-6, 1e-2, shape)   # solar masses
+    rho = rng.uniform(1e6, 1e7, shape) # solar masses/au^3
+    rho[..., 1] = 2.3e6  # mean solar density, solar masses/au^3
+
+    # Assign player to index 0, sun to index 1, and other bodies after
+    r0[..., 0, :] = np.array([scale, 0])
+    m0[..., 1] = 1 # mass in solar masses
+    m0[..., 0] = 1e-4
+    v0 = vis_viva(r0) # elliptical orbits, semimajor axis given by r0
+    r0[..., 1, :] = 0 # initialize sun at centre
+    v0[..., 1, :] = 0 # sun at rest in centre of system
+    return r0, v0, m0, rho
 
 def vis_viva(r0):
     # find (initial) velocity of elliptical orbit using vis viva equation
@@ -47,12 +271,95 @@ def vis_viva(r0):
     tan_vec = utils.tangent_vector(rad_vec)
     return np.sqrt(G*1/a)*tan_vec
 
-def gravity_acc(r, m):
-    # calculate n body problem in inefficient manner :(
-    d = r - r[:, np.newaxis] # find all distances
-    f = np.zeros((len(r), len(r)-1, 2)) # forces
-    indices = np.arange(len(r))
-    for i in range(len(r)):
-        mask = indices != i # do not include the body itself
-        f[i] = G*m[mask, None]/np.linalg.norm(d[i, mask], axis = -1, keepdims = True)**3*d[i,mask]
-    return np.sum(f, axis = 1)
+class DirectGravity:
+    def __init__(self, softening = 0):
+        '''
+        Direct O(N^2) summation of all pairwise accelerations in one pass
+        softening: Plummer softening length [AU], keeps close encounters finite
+        Scratch buffers are kept between calls, and only reallocated when the
+        number of bodies changes (i.e. when a body is consumed).
+        Positions may carry leading axes, e.g. r.shape = (n_systems, n, 2), in
+        which case every system is computed independently in the same pass.
+        The accelerations returned by __call__ and field() are these buffers
+        themselves: the next call overwrites them, so callers that keep them
+        across evaluations must copy them (as integrators.rk4 and block do).
+        '''
+        self.softening = softening
+        self.shape = None # shape of current buffers, r.shape[:-1]
+        # separate, growable buffers for field()
+        self.field_d = np.empty(0)
+        self.field_inv_d3 = np.empty(0)
+        self.field_acc = np.empty((0, 2))
+
+    def allocate(self, shape):
+        n = shape[-1]
+        self.shape = shape
+        self.d = np.empty(shape + (n, 2)) # separation vectors, d[..., i, j] = r[j] - r[i]
+        self.inv_d3 = np.empty(shape + (n,)) # G*m[j]/|d|^3
+        self.acc = np.empty(shape + (2,))
+        self.diag = np.arange(n) # used to remove self-interaction
+
+    def __call__(self, r, m):
+        if r.shape[:-1] != self.shape:
+            self.allocate(r.shape[:-1])
+        d = self.d
+        inv_d3 = self.inv_d3
+        np.subtract(r[..., np.newaxis, :, :], r[..., np.newaxis, :], out = d)
+        np.einsum('...ijk,...ijk->...ij', d, d, out = inv_d3) # squared distances
+        inv_d3 += self.softening**2
+        inv_d3[..., self.diag, self.diag] = np.inf # no force from the body itself
+        np.power(inv_d3, -1.5, out = inv_d3)
+        inv_d3 *= G*m[..., np.newaxis, :]
+        # acc[i] = sum_j G*m[j]/|d_ij|^3*d_ij
+        return np.einsum('...ij,...ijk->...ik', inv_d3, d, out = self.acc)
+
+    def field(self, targets, r, m):
+        # acceleration at the points targets, due to bodies at r with masses m
+        # used for massless test particles and for subsets of the bodies themselves;
+        # a body exerts no force on a target at exactly its own position
+        nt, ns = len(targets), len(r)
+        if len(self.field_inv_d3) < nt*ns or len(self.field_acc) < nt:
+            # grow flat buffers, views of the right shape are taken below
+            size = max(len(self.field_inv_d3), nt*ns)
+            self.field_d = np.empty(2*size)
+            self.field_inv_d3 = np.empty(size)
+            self.field_acc = np.empty((max(nt, len(self.field_acc)), 2))
+        d = self.field_d[:2*nt*ns].reshape(nt, ns, 2)
+        inv_d3 = self.field_inv_d3[:nt*ns].reshape(nt, ns)
+        np.subtract(r[np.newaxis], targets[:, np.newaxis], out = d)
+        np.einsum('ijk,ijk->ij', d, d, out = inv_d3)
+        inv_d3 += self.softening**2
+        inv_d3[inv_d3 == 0] = np.inf
+        np.power(inv_d3, -1.5, out = inv_d3)
+        inv_d3 *= G*m[np.newaxis]
+        return np.einsum('ij,ijk->ik', inv_d3, d, out = self.field_acc[:nt])
+
+def make_gravity(backend = 'direct', softening = 0, theta = 0.5):
+    # select gravity backend; theta is the Barnes-Hut opening angle
+    if backend == 'direct':
+        return DirectGravity(softening)
+    elif backend == 'barnes_hut':
+        from barnes_hut import BarnesHutGravity # barnes_hut imports G from here
+        return BarnesHutGravity(theta, softening)
+    raise ValueError(f'Unknown gravity backend: {backend}')
+
+def gravity_jerk(r, v, m, softening = 0, index = None):
+    # time derivative of the gravitational acceleration of bodies index (default all)
+    index = np.arange(len(r)) if index is None else np.asarray(index)
+    d = r - r[index, np.newaxis]
+    dv = v - v[index, np.newaxis]
+    dist2 = np.sum(d**2, axis = -1) + softening**2
+    dist2[np.arange(len(index)), index] = np.inf # no jerk from the body itself
+    rv = np.sum(d*dv, axis = -1)
+    jerk = G*m[np.newaxis, :, np.newaxis]*(dv/dist2[..., np.newaxis]**1.5
+           - 3*(rv/dist2**2.5)[..., np.newaxis]*d)
+    return np.sum(jerk, axis = 1)
+
+KERNELS = {} # DirectGravity per softening length, shared by all gravity_acc calls
+
+def gravity_acc(r, m, softening = 0):
+    # calculate n body problem in one vectorized pass
+    # the kernel (and its buffers) is reused; the result is a copy the caller owns
+    if softening not in KERNELS:
+        KERNELS[softening] = DirectGravity(softening)
+    return KERNELS[softening](r, m).copy()
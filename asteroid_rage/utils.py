@@ -1,4 +1,3 @@
-import pyglet
 import numpy as np
 
 # module for creating some simple tools for use in main project
@@ -22,3 +21,10 @@ def tangent_vector(r):
 def transform(coord, scale, center):
     # shift coord from [-system size, system size] to [height, width]*zoom
     return coord*np.amin(center)/(scale) + center
+
+def expand(first, count):
+    # expand ranges [first, first + count) into flat indices, and
+    # the index of the range each flat index came from
+    owner = np.repeat(np.arange(len(first)), count)
+    shift = np.asarray(first) - (np.cumsum(count) - count) # flat position -> index
+    return owner, np.arange(len(owner)) + shift[owner]
@@ -0,0 +1,229 @@
+import os
+import sys
+import json
+import timeit
+import argparse
+import platform
+import numpy as np
+# benchmarks of the physics and vision hot paths, with regression checks
+#
+# python3 bench.py --save          time every case and store the results as the baseline
+# python3 bench.py                 time every case and compare with the baseline;
+#                                  exits with status 1 if a case got slower than the threshold
+# python3 bench.py -k gravity      only cases whose name contains 'gravity'
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, 'asteroid_rage'), os.path.join(ROOT, 'velocity_pong')]
+
+from solar_system import SolarSystem, StudentSolarSystem, make_gravity
+from screen_transform import ScreenTransform
+from velpong import VelPong
+from motion import MotionDetector
+from distance_field import DistanceField
+from balls import spawn
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+THRESHOLD = 0.25 # fail if a case is more than 25 % slower than its baseline
+MIN_SLOWDOWN = 20e-6 # ... and slower by at least this much [s], so timer noise on tiny cases passes
+REPEATS = 5 # the best of REPEATS timings is kept, to suppress noise
+MIN_TIME = 0.2 # each timing runs a case for at least this long [s]
+CONSUME_CALLS = 50 # calls per timing of convert_to_fuel_consume, each eats a batch of bodies
+BODY_COUNTS = [10, 100, 1000, 10000]
+SYSTEM_SIZE = 30 # AU
+WIDTH, HEIGHT = 640, 480 # camera frame size of velocity pong
+THRESH = 10 # change threshold of velocity pong
+
+# Each case returns (run, reset, number): run is timed, reset (or None) is called,
+# untimed, before every timing, and number is how many calls of run one timing
+# makes (None = as many as fit in MIN_TIME).
+
+def case_gravity_acc(n):
+    # the kernel as SolarSystem uses it, with its buffers reused between calls
+    sol = SolarSystem(n, SYSTEM_SIZE)
+    gravity = make_gravity('direct')
+    return lambda: gravity(sol.r, sol.m), None, None
+
+def case_update(n, gravity = 'direct'):
+    sol = SolarSystem(n, SYSTEM_SIZE, gravity = gravity)
+    return lambda: sol.update(1e-3), None, None
+
+def case_screen_transform(n):
+    transform = ScreenTransform(1920, 1080, SYSTEM_SIZE)
+    coords = np.random.default_rng(0).uniform(-SYSTEM_SIZE, SYSTEM_SIZE, (n, 2))
+    return lambda: transform(coords), None, None
+
+def case_convert_to_fuel(n, consume):
+    # n conversions per call, a single one takes only microseconds
+    # consume: bodies are eaten whole (and removed), otherwise a bite of each of n bodies
+    if consume:
+        n_bodies, number = 2 + CONSUME_CALLS*n, CONSUME_CALLS # enough to eat for every call
+    else:
+        n_bodies, number = n + 1, None
+    sol = []
+    def reset():
+        sol[:] = [StudentSolarSystem(n_bodies, SYSTEM_SIZE, rng = np.random.default_rng(0))]
+    def run():
+        for i in range(1, n + 1):
+            sol[0].convert_to_fuel(1 if consume else i, np.inf if consume else 1e-12)
+    if not consume:
+        reset() # bites never use up a body, one system serves all timings
+        reset = None
+    return run, reset, number
+
+def synthetic_frames(n_blobs = 5, shift = 25, seed = 0):
+    # two noisy grayscale camera frames, with bright blobs (hands) that moved in between
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[:HEIGHT, :WIDTH]
+    centres = rng.uniform([60, 60], [WIDTH - 60, HEIGHT - 60], (n_blobs, 2))
+    frames = []
+    for offset in (0, shift):
+        frame = rng.normal(100, 3, (HEIGHT, WIDTH))
+        for cx, cy in centres + offset:
+            frame[(x - cx)**2 + (y - cy)**2 < 40**2] = 200
+        frames.append(np.clip(frame, 0, 255).astype(np.uint8))
+    return frames
+
+def make_velpong(**motion):
+    # VelPong without its window and camera; only the image processing is used
+    # motion: options of its MotionDetector
+    game = VelPong.__new__(VelPong)
+    game.thresh = THRESH
+    game.motion = MotionDetector(THRESH, **motion)
+    game.w, game.h = WIDTH, HEIGHT
+    game.previmg, frame = synthetic_frames()
+    return game, frame
+
+def case_frame_change(**motion):
+    game, frame = make_velpong(**motion)
+    return lambda: game.frame_change(frame), None, None
+
+def case_find_contours():
+    game, frame = make_velpong()
+    change = game.frame_change(frame)
+    pos = np.array([WIDTH/2, HEIGHT/2])
+    return lambda: game.find_contours(change, pos), None, None
+
+def case_closest_contour():
+    game, frame = make_velpong()
+    pos = np.array([WIDTH/2, HEIGHT/2])
+    gameframe, contours = game.find_contours(game.frame_change(frame), pos)
+    return lambda: game.closest_contour(contours, pos), None, None
+
+def case_distance_field(**motion):
+    # build the field from a motion mask, and look up a ball
+    game, frame = make_velpong(**motion)
+    game.frame_change(frame)
+    field = DistanceField()
+    pos = np.array([WIDTH/2, HEIGHT/2])
+    def run():
+        field.update(game.motion.mask, game.motion.scale)
+        field.lookup(pos)
+    return run, None, None
+
+def case_balls(n):
+    # one step of n fast balls, swept against the motion of the synthetic frames
+    game, frame = make_velpong()
+    field = DistanceField()
+    field.update(game.frame_change(frame))
+    balls = spawn(n, WIDTH, HEIGHT, speed = 20000, dt = 1e-3, seed = 0)
+    return lambda: balls.step(field), None, None
+
+CASES = {}
+for n in BODY_COUNTS:
+    CASES[f'gravity_acc[{n}]'] = lambda n = n: case_gravity_acc(n)
+    CASES[f'update[{n}]'] = lambda n = n: case_update(n)
+    CASES[f'update_barnes_hut[{n}]'] = lambda n = n: case_update(n, 'barnes_hut')
+CASES['screen_transform[1000000]'] = lambda: case_screen_transform(1000000)
+CASES['convert_to_fuel[1000]'] = lambda: case_convert_to_fuel(1000, consume = False)
+CASES['convert_to_fuel_consume[1000]'] = lambda: case_convert_to_fuel(1000, consume = True)
+CASES['frame_change'] = case_frame_change
+CASES['frame_change_scale2'] = lambda: case_frame_change(scale = 2)
+CASES['frame_change_box_scale2'] = lambda: case_frame_change(scale = 2, filter = 'box')
+CASES['find_contours'] = case_find_contours
+CASES['closest_contour'] = case_closest_contour
+CASES['distance_field'] = case_distance_field
+CASES['distance_field_scale2'] = lambda: case_distance_field(scale = 2)
+CASES['balls[1]'] = lambda: case_balls(1)
+CASES['balls[1000]'] = lambda: case_balls(1000)
+
+def measure(run, reset = None, number = None, repeats = REPEATS):
+    # best time per call of run [s]
+    timer = timeit.Timer(run)
+    if number is None:
+        if reset:
+            reset()
+        number, elapsed = timer.autorange()
+        number = max(1, int(number*MIN_TIME/max(elapsed, 1e-9)))
+    best = np.inf
+    for i in range(repeats):
+        if reset:
+            reset()
+        best = min(best, timer.timeit(number)/number)
+    return best
+
+def run_cases(names, repeats = REPEATS):
+    results = {}
+    for name in names:
+        results[name] = measure(*CASES[name](), repeats = repeats)
+        print('%-32s %12.3f ms' %(name, results[name]*1e3), flush = True)
+    return results
+
+def compare(results, baseline, threshold = THRESHOLD):
+    # report results against the baseline, and return the names of cases that regressed
+    # (slower by more than threshold, and by more than MIN_SLOWDOWN per call)
+    regressions = []
+    print('\n%-32s %12s %12s %8s' %('case', 'time [ms]', 'base [ms]', 'ratio'))
+    for name, seconds in results.items():
+        if name not in baseline:
+            print('%-32s %12.3f %12s %8s' %(name, seconds*1e3, '-', '-'))
+            continue
+        ratio = seconds/baseline[name]
+        status = ''
+        if ratio > 1 + threshold and seconds - baseline[name] > MIN_SLOWDOWN:
+            regressions.append(name)
+            status = '  REGRESSION'
+        print('%-32s %12.3f %12.3f %8.2f%s' %(name, seconds*1e3, baseline[name]*1e3, ratio, status))
+    return regressions
+
+def load_baseline(filename):
+    if not os.path.exists(filename):
+        return {}
+    with open(filename) as f:
+        return json.load(f)['cases']
+
+def save_baseline(filename, results):
+    # results are merged into the existing baseline, so a subset can be re-measured
+    cases = load_baseline(filename)
+    cases.update(results)
+    data = {'machine': platform.platform(), 'python': platform.python_version(),
+            'numpy': np.__version__, 'cases': cases}
+    with open(filename, 'w') as f:
+        json.dump(data, f, indent = 1)
+
+def parse_args(argv = None):
+    parser = argparse.ArgumentParser(description = 'Benchmark the physics and vision hot paths')
+    parser.add_argument('-k', dest = 'select', default = '', help = 'only run cases whose name contains this')
+    parser.add_argument('--baseline', default = BASELINE, help = 'baseline JSON file')
+    parser.add_argument('--save', action = 'store_true', help = 'store the results as the new baseline')
+    parser.add_argument('--threshold', type = float, default = THRESHOLD,
+                        help = 'allowed slowdown relative to the baseline, as a fraction')
+    parser.add_argument('--repeats', type = int, default = REPEATS, help = 'timings per case, the best is kept')
+    parser.add_argument('--list', action = 'store_true', help = 'list the cases and exit')
+    return parser.parse_args(argv)
+
+if __name__ == '__main__':
+    args = parse_args()
+    names = [name for name in CASES if args.select in name]
+    if args.list:
+        print('\n'.join(names))
+        sys.exit(0)
+    results = run_cases(names, args.repeats)
+    if args.save:
+        save_baseline(args.baseline, results)
+        print('Saved baseline to', args.baseline)
+        sys.exit(0)
+    regressions = compare(results, load_baseline(args.baseline), args.threshold)
+    if regressions:
+        print('\n%d case(s) slower than the baseline by more than %d %%: %s'
+              %(len(regressions), args.threshold*100, ', '.join(regressions)))
+        sys.exit(1)
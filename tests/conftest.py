@@ -0,0 +1,7 @@
+import os
+import sys
+# both games are plain script folders; make their modules importable by the tests
+# one test file per module, run with: python3 -m pytest tests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, 'asteroid_rage'), os.path.join(ROOT, 'velocity_pong')]
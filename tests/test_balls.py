@@ -0,0 +1,21 @@
+import numpy as np
+
+from distance_field import DistanceField
+from balls import Balls
+
+
+def test_balls_do_not_tunnel():
+    # a wall of motion 12 pixels thick (2*CONTACT), balls crossing it in one step
+    w, h = 640, 480
+    mask = np.zeros((h, w), dtype = np.uint8)
+    mask[:, 314:326] = 255
+    field = DistanceField()
+    field.update(mask)
+    n = 200
+    y = np.linspace(20, h - 20, n)
+    pos = np.stack((np.full(n, 100.0), y), axis = -1)
+    v = np.stack((np.full(n, 500000.0), np.zeros(n)), axis = -1) # 500 pixels per step
+    balls = Balls(pos, v, 1e-3, w, h)
+    balls.step(field)
+    assert np.all(balls.pos[:, 0] < 314) # stopped in front of the wall
+    assert np.all(balls.v[:, 0] < 0) # and bounced back
@@ -0,0 +1,32 @@
+import numpy as np
+
+from solar_system import DirectGravity
+from barnes_hut import BarnesHutGravity, check_accuracy
+
+
+def test_theta_zero_is_direct():
+    # with opening angle 0 no cell is approximated, every pair is summed exactly
+    rng = np.random.default_rng(0)
+    r = rng.uniform(-30, 30, (500, 2))
+    m = rng.uniform(1e-6, 1e-2, 500)
+    exact = DirectGravity(0.01)(r, m)
+    approx = BarnesHutGravity(0, 0.01)(r, m)
+    np.testing.assert_allclose(approx, exact, rtol = 1e-9, atol = 1e-12)
+
+
+def test_coincident_particles():
+    r = np.zeros((40, 2))
+    r[20:] = 1
+    m = np.ones(40)
+    np.testing.assert_allclose(BarnesHutGravity(0.5, 0.1)(r, m), DirectGravity(0.1)(r, m), atol = 1e-10)
+
+
+def test_accuracy_bounds():
+    # errors relative to the mean acceleration; they grow with the opening angle
+    rng = np.random.default_rng(1)
+    r = rng.uniform(-30, 30, (2000, 2))
+    m = rng.uniform(1e-6, 1e-2, 2000)
+    errors = [check_accuracy(r, m, theta) for theta in (0.3, 0.5, 1.0)]
+    median, worst = errors[1]
+    assert median < 2e-3 and worst < 1e-2
+    assert errors[0][0] < errors[1][0] < errors[2][0]
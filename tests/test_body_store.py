@@ -0,0 +1,21 @@
+import numpy as np
+
+from body_store import BodyStore
+
+
+def test_body_store_remove_keeps_ids():
+    store = BodyStore(10, {'x': ((), float)})
+    store.extend(x = np.arange(10.0)) # ids 0..9, x = id
+    store.objects[:10] = [f'body {i}' for i in range(10)]
+    rng = np.random.default_rng(2)
+    removed = []
+    for k in range(7):
+        slot = rng.integers(store.n)
+        removed.append(store.remove(slot))
+        ids = store.ids[:store.n]
+        np.testing.assert_array_equal(store.slot_of[ids], np.arange(store.n))
+        np.testing.assert_array_equal(store.view('x'), ids) # columns moved with their ids
+        assert store.objects[:store.n] == [f'body {i}' for i in ids]
+        assert store.objects[store.n:] == [None]*(10 - store.n)
+    assert np.all(store.slot_of[removed] == -1)
+    assert sorted(removed + list(store.ids[:store.n])) == list(range(10))
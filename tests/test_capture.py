@@ -0,0 +1,42 @@
+import time
+import numpy as np
+
+from capture import FrameSource, FrameGrabber, synthetic_frames
+
+
+def numbered_frames(n, w = 64, h = 48):
+    # frame k is filled with k, so a frame tells which one it is
+    return [np.full((h, w), k, dtype = np.uint8) for k in range(n)]
+
+
+def test_frame_source_reads_every_frame():
+    colour = np.zeros((48, 64, 3), dtype = np.uint8)
+    colour[..., 2] = 255 # red, as BGR
+    source = FrameSource(numbered_frames(5) + [colour])
+    assert (source.width, source.height) == (64, 48)
+    out = np.empty((48, 64), dtype = np.uint8)
+    values = []
+    while source.read(out):
+        values.append(int(out[0, 0]))
+    assert values == [0, 1, 2, 3, 4, 76] # colour frames become grayscale
+    assert len(list(synthetic_frames(160, 120, n_frames = 7))) == 7
+
+
+def test_grabber_hands_out_latest_frames():
+    n = 200
+    grabber = FrameGrabber(FrameSource(numbered_frames(n)))
+    values = []
+    while True:
+        success, frame = grabber.read(timeout = 1)
+        if not success:
+            break
+        value = int(frame[0, 0])
+        time.sleep(1e-4) # the producer keeps capturing, but never into this frame
+        assert np.all(frame == value)
+        values.append(value)
+    grabber.stop()
+    assert grabber.finished
+    assert grabber.captured == n
+    assert values == sorted(set(values)) # in order, each frame at most once
+    assert values[-1] == n - 1 # the last frame is never dropped
+    assert len(values) + grabber.dropped == n
@@ -0,0 +1,31 @@
+import numpy as np
+
+from solar_system import StudentSolarSystem
+from collisions import find_overlaps, merge_overlaps
+
+
+def test_find_overlaps_matches_brute_force():
+    rng = np.random.default_rng(1)
+    r = rng.uniform(-10, 10, (400, 2))
+    radius = rng.uniform(0.05, 0.4, 400)
+    radius[:3] = [3, 2, 1.5] # a few big bodies, compared with everything
+    i, j = find_overlaps(r, radius)
+    d = np.linalg.norm(r[:, np.newaxis] - r, axis = -1)
+    expected = np.argwhere(np.triu(d < radius[:, np.newaxis] + radius, 1))
+    found = np.stack((i, j), axis = -1)
+    assert len(found) == len(np.unique(found, axis = 0)) # every pair once
+    assert sorted(map(tuple, found)) == sorted(map(tuple, expected))
+
+
+def test_merges_conserve_mass_momentum_volume():
+    sol = StudentSolarSystem(12, 30, rng = np.random.default_rng(3))
+    sol.r[3:6] = sol.r[2] # three planets on top of one another
+    sol.r[8] = sol.r[7]
+    before = (np.sum(sol.m), np.sum(sol.m[:, np.newaxis]*sol.v, axis = 0), np.sum(sol.m/sol.rho))
+    merge_overlaps(sol)
+    while len(find_overlaps(sol.r[1:], sol.radius[1:])[0]): # bodies merge once per call
+        merge_overlaps(sol)
+    after = (np.sum(sol.m), np.sum(sol.m[:, np.newaxis]*sol.v, axis = 0), np.sum(sol.m/sol.rho))
+    assert len(sol.r) <= 8
+    for x, y in zip(before, after):
+        np.testing.assert_allclose(y, x, rtol = 1e-12)
@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+
+from distance_field import DistanceField
+
+
+def disc_mask(w, h, centre, radius):
+    y, x = np.mgrid[:h, :w]
+    return np.where((x - centre[0])**2 + (y - centre[1])**2 <= radius**2, 255, 0).astype(np.uint8)
+
+
+@pytest.mark.parametrize('scale', [1, 2])
+def test_distance_and_normal_of_a_disc(scale):
+    # a disc of motion at frame position (320, 240) with radius 80, mask at 1/scale resolution
+    centre, radius = np.array([320, 240]), 80
+    mask = disc_mask(640//scale, 480//scale, (centre + 0.5)/scale - 0.5, radius/scale)
+    field = DistanceField()
+    field.update(mask, scale)
+    rng = np.random.default_rng(7)
+    angle = rng.uniform(0, 2*np.pi, 50)
+    r = rng.uniform(20, 200, 50)
+    direction = np.stack((np.cos(angle), np.sin(angle)), axis = -1)
+    distance, normal = field.lookup(centre + r[:, np.newaxis]*direction)
+    np.testing.assert_allclose(distance, r - radius, rtol = 0.03, atol = 2*scale) # negative inside
+    assert np.all(np.sum(normal*direction, axis = -1) > 0.95) # pointing away from the motion
+
+
+def test_without_motion_the_field_is_flat():
+    field = DistanceField()
+    field.update(np.zeros((480, 640), dtype = np.uint8))
+    distance, normal = field.lookup([[0, 0], [320, 240], [639, 479]])
+    assert np.all(distance > 480) and np.all(np.isfinite(distance))
+    assert not np.any(normal)
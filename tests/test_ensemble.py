@@ -0,0 +1,30 @@
+import numpy as np
+
+from solar_system import SolarSystem
+from ensemble import EnsembleSolarSystem
+
+
+def test_same_initial_conditions_as_solar_system():
+    sol = SolarSystem(9, 30, rng = np.random.default_rng(4))
+    ensemble = EnsembleSolarSystem(1, 9, 30, rng = np.random.default_rng(4))
+    for name in ('r', 'v', 'm', 'rho'):
+        np.testing.assert_array_equal(getattr(ensemble, name)[0], getattr(sol, name))
+
+
+def test_ensemble_matches_independent_systems():
+    systems = [SolarSystem(9, 30, softening = 0.1, integrator = 'leapfrog',
+                           rng = np.random.default_rng(seed)) for seed in range(4)]
+    ensemble = EnsembleSolarSystem(4, 9, 30, softening = 0.1, integrator = 'leapfrog')
+    for name in ('r', 'v', 'm', 'rho'):
+        setattr(ensemble, name, np.stack([getattr(sol, name).copy() for sol in systems]))
+    ensemble.invalidate()
+    np.testing.assert_allclose(ensemble.energy(), [sol.energy() for sol in systems], rtol = 1e-12)
+    for i in range(200):
+        ensemble.update(0.01)
+        for sol in systems:
+            sol.update(0.01)
+    for k, sol in enumerate(systems):
+        np.testing.assert_allclose(ensemble.r[k], sol.r, rtol = 1e-9, atol = 1e-12)
+        np.testing.assert_allclose(ensemble.v[k], sol.v, rtol = 1e-9, atol = 1e-12)
+    np.testing.assert_allclose(ensemble.energy(), [sol.energy() for sol in systems], rtol = 1e-12)
+    assert ensemble.force_evals == systems[0].force_evals
@@ -0,0 +1,59 @@
+import numpy as np
+
+from solar_system import G, DirectGravity, gravity_acc
+
+
+def naive_acc(r, m, softening = 0):
+    # reference: one pair at a time
+    acc = np.zeros_like(r)
+    for i in range(len(r)):
+        for j in range(len(r)):
+            if i != j:
+                d = r[j] - r[i]
+                acc[i] += G*m[j]*d/(d @ d + softening**2)**1.5
+    return acc
+
+
+def test_direct_matches_double_loop():
+    rng = np.random.default_rng(0)
+    r = rng.uniform(-30, 30, (40, 2))
+    m = rng.uniform(1e-6, 1, 40)
+    for softening in (0, 0.5):
+        np.testing.assert_allclose(DirectGravity(softening)(r, m), naive_acc(r, m, softening),
+                                   rtol = 1e-10)
+
+
+def test_direct_batched_systems():
+    # leading axes are independent systems
+    rng = np.random.default_rng(1)
+    r = rng.uniform(-30, 30, (3, 20, 2))
+    m = rng.uniform(1e-6, 1, (3, 20))
+    acc = DirectGravity(0.1)(r, m)
+    for k in range(3):
+        np.testing.assert_allclose(acc[k], naive_acc(r[k], m[k], 0.1), rtol = 1e-10)
+
+
+def test_direct_reallocates_when_bodies_change():
+    rng = np.random.default_rng(2)
+    kernel = DirectGravity()
+    for n in (10, 9, 12):
+        r = rng.uniform(-30, 30, (n, 2))
+        m = rng.uniform(1e-6, 1, n)
+        np.testing.assert_allclose(kernel(r, m), naive_acc(r, m), rtol = 1e-10)
+
+
+def test_field_excludes_coincident_body():
+    rng = np.random.default_rng(3)
+    r = rng.uniform(-30, 30, (15, 2))
+    m = rng.uniform(1e-6, 1, 15)
+    np.testing.assert_allclose(DirectGravity().field(r[:5], r, m), naive_acc(r, m)[:5], rtol = 1e-10)
+
+
+def test_gravity_acc_result_is_not_overwritten():
+    rng = np.random.default_rng(4)
+    r = rng.uniform(-30, 30, (8, 2))
+    m = rng.uniform(1e-6, 1, 8)
+    first = gravity_acc(r, m)
+    kept = first.copy()
+    gravity_acc(r + 1e-3, m)
+    np.testing.assert_array_equal(first, kept)
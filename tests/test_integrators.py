@@ -0,0 +1,62 @@
+import numpy as np
+
+from solar_system import SolarSystem
+
+
+def energy_error(integrator, dt, t_end = 2):
+    sol = SolarSystem(9, 30, integrator = integrator, rng = np.random.default_rng(0))
+    e0 = sol.energy()
+    for i in range(int(round(t_end/dt))):
+        sol.update(dt)
+    return abs(sol.energy()/e0 - 1), sol.force_evals
+
+
+def test_energy_error_ordering():
+    errors = {name: energy_error(name, 0.01)[0] for name in ('euler_cromer', 'leapfrog', 'yoshida4', 'rk4')}
+    assert errors['leapfrog'] < errors['euler_cromer']/100
+    assert errors['yoshida4'] < errors['leapfrog']/100
+    assert errors['rk4'] < errors['leapfrog']/100
+
+
+def test_convergence_order():
+    # halving the step divides the error by 2^order
+    for name, order in (('euler_cromer', 1), ('leapfrog', 2)):
+        ratio = energy_error(name, 0.01)[0]/energy_error(name, 0.005)[0]
+        assert 0.8*2**order < ratio < 1.25*2**order
+
+
+def test_force_evaluations_per_step():
+    # cached forces are reused between steps where the scheme allows
+    for name, per_step in (('euler_cromer', 1), ('leapfrog', 1), ('yoshida4', 3), ('rk4', 4)):
+        evals = energy_error(name, 0.01, t_end = 1)[1]
+        assert abs(evals - 100*per_step) <= 1
+
+
+def test_block_is_leapfrog_without_encounters():
+    plain = SolarSystem(9, 30, integrator = 'leapfrog', rng = np.random.default_rng(0))
+    block = SolarSystem(9, 30, integrator = 'block', rng = np.random.default_rng(0))
+    for i in range(200):
+        plain.update(1e-3)
+        block.update(1e-3)
+    np.testing.assert_array_equal(block.r, plain.r)
+    assert block.force_evals == plain.force_evals
+
+
+def close_encounter(integrator):
+    # two planets passing within 0.05 AU of each other
+    sol = SolarSystem(9, 30, integrator = integrator, rng = np.random.default_rng(0))
+    sol.r[3] = sol.r[2] + [0.05, 0]
+    sol.v[3] = sol.v[2] + [0, 1]
+    sol.m[2] = sol.m[3] = 1e-3
+    sol.invalidate()
+    e0 = sol.energy()
+    for i in range(100):
+        sol.update(0.01)
+    return abs(sol.energy()/e0 - 1), sol
+
+
+def test_block_substeps_close_encounters():
+    leapfrog_error, plain = close_encounter('leapfrog')
+    block_error, block = close_encounter('block')
+    assert block_error < leapfrog_error/100
+    assert block.force_evals_saved > block.force_evals # most bodies kept the long step
@@ -0,0 +1,44 @@
+import numpy as np
+
+from kepler import KeplerOrbits
+from solar_system import SolarSystem
+
+
+def test_kepler_matches_leapfrog():
+    # bound orbits of increasing eccentricity, after a few periods
+    mu = 39.478
+    r0 = np.array([[1, 0], [2, 0.5], [0, 3], [-1.5, -1]], dtype = float)
+    v0 = np.array([[0, 6.28], [-1, 3], [-4, 0.5], [1, -2]], dtype = float)
+    orbits = KeplerOrbits(len(r0))
+    index = np.arange(len(r0))
+    orbits.fit(index, r0, v0, mu, 0)
+    t_end, steps = 3, 30000 # leapfrog error ~5e-5 AU
+    dt = t_end/steps
+    r, v = r0.copy(), v0.copy()
+    def acc(r):
+        return -mu*r/np.linalg.norm(r, axis = -1, keepdims = True)**3
+    for i in range(steps):
+        v += dt/2*acc(r)
+        r += dt*v
+        v += dt/2*acc(r)
+    r_kepler, v_kepler = orbits.state_at(t_end, index)
+    np.testing.assert_allclose(r_kepler, r, rtol = 0, atol = 1e-3)
+    np.testing.assert_allclose(v_kepler, v, rtol = 0, atol = 1e-3)
+
+
+def light_system(hybrid):
+    # planets (and player) so light that they barely perturb one another
+    sol = SolarSystem(9, 30, hybrid = hybrid, integrator = 'leapfrog', rng = np.random.default_rng(0))
+    sol.m[0] = sol.m[2:] = 1e-7
+    sol.invalidate()
+    return sol
+
+
+def test_hybrid_saves_force_evaluations():
+    full, hybrid = light_system(False), light_system(True)
+    for i in range(1000):
+        full.update(1e-3)
+        hybrid.update(1e-3)
+    assert hybrid.on_kepler.sum() == 7 # every planet, never the star or the player
+    assert hybrid.force_evals < 0.4*full.force_evals
+    np.testing.assert_allclose(hybrid.r, full.r, rtol = 0, atol = 1e-5)
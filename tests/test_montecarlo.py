@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+
+from montecarlo import DEFAULTS, run_sweep, read_columns
+
+
+def small_config(**changes):
+    config = dict(DEFAULTS, n_bodies = 5, steps = 20)
+    config.update(changes)
+    return config
+
+
+def test_resume_round_trip(tmp_path):
+    path = str(tmp_path/'sweep')
+    config = small_config()
+    assert run_sweep(path, list(range(4)), config, workers = 2, chunk_size = 2) == 4
+    first = read_columns(path)
+    # an interrupted sweep resumed with more seeds only runs the missing ones
+    assert run_sweep(path, list(range(6)), config, workers = 2, chunk_size = 2) == 2
+    data = read_columns(path)
+    assert sorted(data['seed'].tolist()) == list(range(6))
+    order = np.argsort(data['seed'])
+    run_sweep(str(tmp_path/'fresh'), list(range(6)), config, workers = 1)
+    fresh = read_columns(str(tmp_path/'fresh'))
+    fresh_order = np.argsort(fresh['seed'])
+    for name in data:
+        if name != 'wall_time': # seeded runs give the same results, wherever they run
+            np.testing.assert_array_equal(data[name][order], fresh[name][fresh_order])
+    for name in first:
+        np.testing.assert_array_equal(data[name][:4], first[name]) # earlier rows untouched
+
+
+def test_resume_refuses_different_config(tmp_path):
+    path = str(tmp_path/'sweep')
+    run_sweep(path, [0, 1], small_config(), workers = 1)
+    with pytest.raises(ValueError, match = 'softening'):
+        run_sweep(path, [0, 1, 2], small_config(softening = 0.1), workers = 1)
+    assert read_columns(path)['seed'].tolist() == [0, 1] # nothing was appended
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from motion import MotionDetector, FILTERS
+
+
+def frames_with_square(w = 320, h = 240):
+    # the previous frame is noisy background, the new one has a bright square in it
+    rng = np.random.default_rng(6)
+    previmg = rng.integers(98, 103, (h, w), dtype = np.uint8)
+    img = previmg.copy()
+    img[80:180, 100:200] = 200
+    return img, previmg
+
+
+@pytest.mark.parametrize('filter', FILTERS)
+@pytest.mark.parametrize('scale', [1, 2])
+def test_mask_covers_the_motion(filter, scale):
+    img, previmg = frames_with_square()
+    motion = MotionDetector(thresh = 10, scale = scale, filter = filter, ksize = 15)
+    mask = motion.detect(img, previmg)
+    assert mask.shape == img.shape
+    assert set(np.unique(mask)) <= {0, 255}
+    assert np.all(mask[95:165, 115:185] == 255) # inside the square, away from its edges
+    assert not np.any(mask[:60]) and not np.any(mask[:, :80]) # background noise is below thresh
+    small = motion.detect(img, previmg, full = False)
+    assert small.shape == (240//scale, 320//scale)
+
+
+def test_median_removes_speckles():
+    previmg = frames_with_square()[1]
+    img = previmg.copy()
+    img[::20, ::20] = 255 # isolated changed pixels, e.g. sensor noise
+    assert np.any(MotionDetector(filter = 'none').detect(img, previmg))
+    assert not np.any(MotionDetector(filter = 'median').detect(img, previmg))
+
+
+def test_coordinates_round_trip():
+    motion = MotionDetector(scale = 4)
+    coords = np.array([[0, 0], [10.5, 3], [319, 239]])
+    np.testing.assert_allclose(motion.to_full(motion.to_small(coords)), coords)
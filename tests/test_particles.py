@@ -0,0 +1,25 @@
+import numpy as np
+
+from solar_system import SolarSystem, DirectGravity
+
+
+def test_particles_exert_no_force():
+    # the same system with and without test particles moves identically
+    plain = SolarSystem(9, 30, integrator = 'leapfrog', rng = np.random.default_rng(0))
+    swarm = SolarSystem(9, 30, n_particles = 500, integrator = 'leapfrog',
+                        rng = np.random.default_rng(0))
+    np.testing.assert_array_equal(swarm.r, plain.r)
+    for i in range(50):
+        plain.update(1e-3)
+        swarm.update(1e-3)
+    np.testing.assert_array_equal(swarm.r, plain.r)
+    np.testing.assert_array_equal(swarm.v, plain.v)
+
+
+def test_particles_feel_the_bodies():
+    sol = SolarSystem(9, 30, n_particles = 100, rng = np.random.default_rng(1))
+    # particles accelerate like massless bodies, and bodies as if there were none
+    acc, pacc = sol.accelerations()
+    everything = DirectGravity()(np.concatenate((sol.r, sol.pr)), np.r_[sol.m, np.zeros(100)])
+    np.testing.assert_allclose(acc, everything[:9], rtol = 1e-10)
+    np.testing.assert_allclose(pacc, everything[9:], rtol = 1e-10)
@@ -0,0 +1,34 @@
+import json
+import numpy as np
+
+from profiler import FrameProfiler
+
+
+def test_rolling_percentiles(tmp_path):
+    profiler = FrameProfiler(window = 100)
+    profiler.stage('physics')
+    for ms in range(200): # only the last 100 samples are kept
+        profiler.record('physics', ms*1e-3)
+    summary = profiler.summary()['physics']
+    assert summary['count'] == 200
+    np.testing.assert_allclose(summary['p50'], np.percentile(np.arange(100, 200), 50))
+    np.testing.assert_allclose(summary['mean'], 149.5)
+    profiler.dump(str(tmp_path/'profile.json'))
+    with open(tmp_path/'profile.json') as f:
+        data = json.load(f)
+    assert len(data['samples']['physics']) == 100
+
+
+def test_stages_and_laps():
+    profiler = FrameProfiler()
+    for frame in range(10):
+        profiler.start()
+        profiler.lap('capture')
+        with profiler.stage('draw'):
+            pass
+        profiler.lap('balls') # includes the draw stage
+    assert profiler.count == {'capture': 10, 'draw': 10, 'balls': 10}
+    assert np.all(profiler.recent('balls') >= profiler.recent('draw'))
+    lines = profiler.report().splitlines()
+    assert lines[0].split() == ['[ms]', 'p50', 'p95', 'p99']
+    assert [line.split()[0] for line in lines[1:]] == ['capture', 'draw', 'balls']
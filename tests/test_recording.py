@@ -0,0 +1,48 @@
+import numpy as np
+
+from solar_system import StudentSolarSystem
+from simulation import Simulation
+from recording import Recorder, Recording
+
+
+def make_system():
+    return StudentSolarSystem(9, 30, n_particles = 20, integrator = 'leapfrog',
+                              rng = np.random.default_rng(5))
+
+
+def test_save_load_seek_round_trip(tmp_path):
+    filename = str(tmp_path/'session.rec')
+    sol = make_system()
+    recorder = Recorder(filename, sol, 4, 0.01) # too small: the file has to grow
+    sim = Simulation(sol, 0.01, recorder = recorder)
+    states = []
+    for step in range(30):
+        recorder.rotation = step
+        sim.step()
+        states.append({'ids': sol.store.ids[:sol.store.n].copy(), 'r': sol.r.copy(),
+                       'radius': sol.radius.copy(), 'pr': sol.pr.copy(), 'time': sol.t})
+        if step == 10:
+            sol.convert_to_fuel(3, 1) # a body is eaten, the last one moves into its slot
+    recorder.close()
+
+    recording = Recording(filename)
+    assert len(recording) == 30 # nothing dropped
+    assert recording.dt == 0.01
+    for step in (0, 10, 11, 29):
+        state = recording.state(step)
+        assert state['rotation'] == step
+        assert state['time'] == states[step]['time']
+        np.testing.assert_array_equal(state['ids'], states[step]['ids'])
+        np.testing.assert_array_equal(state['r'], states[step]['r'])
+        np.testing.assert_allclose(state['pr'], states[step]['pr'], rtol = 1e-6) # float32
+    assert recording.seek(states[12]['time']) == 12
+    assert recording.seek(1e9) == 29
+
+    # replay into a fresh system, backwards through the removal and forwards again
+    replay = make_system()
+    for step in (29, 5, 20):
+        recording.load(step, replay)
+        np.testing.assert_array_equal(replay.store.ids[:replay.store.n], states[step]['ids'])
+        np.testing.assert_array_equal(replay.r, states[step]['r'])
+        np.testing.assert_array_equal(replay.radius, states[step]['radius'])
+        assert replay.t == states[step]['time']
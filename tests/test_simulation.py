@@ -0,0 +1,49 @@
+import numpy as np
+
+from solar_system import SolarSystem
+from simulation import Simulation, run_headless
+
+
+def make_simulation(dt = 0.01, **kwargs):
+    return Simulation(SolarSystem(9, 30, rng = np.random.default_rng(0)), dt = dt, **kwargs)
+
+
+def test_accumulator_step_counts():
+    sim = make_simulation()
+    assert sim.advance(0.025) == 2 # 0.005 left over
+    assert sim.advance(0.004) == 0
+    assert sim.advance(0.001 + 1e-12) == 1
+    assert sim.steps == 3
+    np.testing.assert_allclose(sim.sol.t, 0.03)
+
+
+def test_slow_frames_do_not_snowball():
+    sim = make_simulation(max_steps = 5)
+    assert sim.advance(1) == 5
+    assert sim.accumulator <= sim.dt
+
+
+def test_interpolation():
+    sim = make_simulation()
+    sim.advance(0.015)
+    assert 0 <= sim.alpha < 1
+    np.testing.assert_allclose(sim.alpha, 0.5)
+    np.testing.assert_allclose(sim.positions(), (sim.prev_r + sim.sol.r)/2)
+    np.testing.assert_allclose(sim.particle_positions(), (sim.prev_pr + sim.sol.pr)/2)
+
+
+def test_same_trajectory_at_any_frame_rate():
+    # the physics only depends on the number of steps, not on how frames split them
+    # (binary fractions, so the accumulator is exact)
+    fast, slow = make_simulation(1/64), make_simulation(1/64)
+    for i in range(60):
+        fast.advance(1/128)
+    for i in range(10):
+        slow.advance(3/64)
+    assert fast.steps == slow.steps == 30
+    np.testing.assert_array_equal(fast.sol.r, slow.sol.r)
+
+
+def test_run_headless():
+    sim, rate = run_headless(20, n_bodies = 5)
+    assert sim.steps == 20 and rate > 0
@@ -0,0 +1,25 @@
+import numpy as np
+
+from velpong import Screen, run_headless
+from capture import synthetic_frames
+from motion import MotionDetector
+from balls import spawn
+
+
+def headless_game(n_frames, max_frames = None):
+    screen = Screen(160, 120, source = synthetic_frames(160, 120, n_frames = n_frames),
+                    threaded = False)
+    balls = spawn(3, screen.width, screen.height, speed = 1e4, dt = 1e-3)
+    return run_headless(screen, balls, MotionDetector(thresh = 10), max_frames)
+
+
+def test_headless_runs_until_the_source_ends():
+    game, fps = headless_game(20)
+    # the first frame is the reference for motion, every later one is a game step
+    assert game.timer.count == {name: 19 for name in ('capture', 'mask', 'field', 'balls', 'draw')}
+    assert fps > 0
+
+
+def test_headless_stops_after_max_frames():
+    game, fps = headless_game(None, max_frames = 10) # endless source
+    assert game.timer.count['capture'] == 10
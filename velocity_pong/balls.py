@@ -0,0 +1,71 @@
+import numpy as np
+
+CONTACT = 6 # ball hits motion closer than this [pixels], half the width of the drawn contours
+
+
+class Balls(object):
+    def __init__(self, pos, v, dt, w, h):
+        # Any number of balls, as arrays of positions and velocities (n, 2)
+        # Collisions with motion are swept along each ball's path every step,
+        # so fast balls can't tunnel through thin moving regions
+        # w, h: size of the playing field [pixels]
+        self.pos = np.array(pos, dtype = float).reshape(-1, 2)
+        self.v = np.array(v, dtype = float).reshape(-1, 2)
+        self.dt = dt
+        self.w = w
+        self.h = h
+        self.end = np.empty_like(self.pos) # end of each ball's path this step
+
+    def step(self, field, contact = CONTACT):
+        # Move all balls one step, bouncing off motion (field: DistanceField) and walls
+        # Returns the goals scored this step, [left wall, right wall]
+        np.multiply(self.v, self.dt, out = self.end)
+        self.end += self.pos
+        self.sweep(field, contact)
+        return self.walls()
+
+    def sweep(self, field, contact = CONTACT):
+        # Move balls along their paths to self.end, stopping at the first point
+        # closer than contact to motion; path points are at most contact apart,
+        # so no motion region (which is at least 2*contact wide in the field) is skipped
+        path = self.end - self.pos
+        length = np.amax(np.linalg.norm(path, axis = -1), initial = 0)
+        n_samples = int(np.ceil(length/contact)) + 1 # incl. where the ball is now
+        t = np.linspace(0, 1, n_samples)[:, np.newaxis]
+        points = self.pos[:, np.newaxis] + t*path[:, np.newaxis] # (balls, samples, 2)
+        distance, normal = field.lookup(points)
+        touching = distance < contact
+        hit = np.any(touching, axis = 1)
+        first = np.argmax(touching, axis = 1) # first touching sample of each ball
+
+        self.pos[~hit] = self.end[~hit]
+        index = np.flatnonzero(hit)
+        distance = distance[index, first[index]]
+        normal = normal[index, first[index]]
+        stuck = ~np.any(normal, axis = -1) # no way out, just fling it back
+        self.v[index[stuck]] *= -1
+        # change only ball direction, and teleport ball to safety along the normal
+        bounce = index[~stuck]
+        speed = np.linalg.norm(self.v[bounce], axis = -1)
+        self.v[bounce] = speed[:, np.newaxis]*normal[~stuck]
+        self.pos[bounce] = points[bounce, first[bounce]] \
+                           + (contact + 1 - distance[~stuck, np.newaxis])*normal[~stuck]
+
+    def walls(self):
+        # Reflect balls off the walls; returns goals scored at the left and right walls
+        left = self.pos[:, 0] <= 1
+        right = self.pos[:, 0] >= self.w - 1
+        top = self.pos[:, 1] <= 1
+        bottom = self.pos[:, 1] >= self.h - 1
+        self.v[left | right, 0] *= -1
+        self.v[top | bottom, 1] *= -1
+        np.clip(self.pos, 1, [self.w - 1, self.h - 1], out = self.pos)
+        return np.array([np.count_nonzero(left), np.count_nonzero(right)])
+
+
+def spawn(n, w, h, speed, dt, seed = None):
+    # n balls in the middle of the field, flying off in random directions at speed [pixels/s]
+    rng = np.random.default_rng(seed)
+    angle = rng.uniform(0, 2*np.pi, n)
+    v = speed*np.stack((np.cos(angle), np.sin(angle)), axis = -1)
+    return Balls(np.tile([w/2, h/2], (n, 1)), v, dt, w, h)
@@ -0,0 +1,132 @@
+import time
+import threading
+import numpy as np
+import cv2
+
+
+class FrameSource(object):
+    def __init__(self, source = 0, x = 640, y = 480):
+        # Reads grayscale frames from a camera (int), a video file (str) or
+        # any iterable of frames (e.g. synthetic_frames), into given buffers
+        self.source = source
+        self.cam = None
+        self.bgr = None # reused colour buffer for camera/video frames
+        if isinstance(source, (int, str)):
+            self.cam = cv2.VideoCapture(source)
+            if not self.cam.isOpened():
+                raise ValueError('Cannot open camera!')
+            if isinstance(source, int):
+                self.cam.set(cv2.CAP_PROP_FRAME_WIDTH, x);
+                self.cam.set(cv2.CAP_PROP_FRAME_HEIGHT, y);
+            self.width = int(self.cam.get(cv2.CAP_PROP_FRAME_WIDTH))
+            self.height = int(self.cam.get(cv2.CAP_PROP_FRAME_HEIGHT))
+            self.fps = self.cam.get(cv2.CAP_PROP_FPS) if isinstance(source, str) else None
+            self.pending = None
+        else:
+            self.frames = iter(source)
+            self.pending = next(self.frames) # first frame tells us the size
+            self.height, self.width = self.pending.shape[:2]
+            self.fps = None
+
+    def read(self, out):
+        # Writes the next frame into out (height x width, uint8), returns success
+        if self.pending is not None:
+            frame, self.pending = self.pending, None
+        elif self.cam is not None:
+            ret, self.bgr = self.cam.read(self.bgr)
+            if not ret:
+                return False
+            frame = self.bgr
+        else:
+            frame = next(self.frames, None)
+            if frame is None:
+                return False
+        if frame.ndim == 3:
+            cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst = out)
+        else:
+            np.copyto(out, frame)
+        return True
+
+    def release(self):
+        if self.cam is not None:
+            self.cam.release()
+
+
+class FrameGrabber(object):
+    def __init__(self, source, n_buffers = 3, fps = None):
+        # Captures frames from source (FrameSource) in a producer thread, into a
+        # ring of preallocated frames. Only the latest frame is handed out;
+        # frames that were replaced before anyone read them count as dropped.
+        # fps limits the capture rate (e.g. to play a video file in real time)
+        self.source = source
+        self.frames = np.zeros((max(n_buffers, 3), source.height, source.width), dtype = np.uint8)
+        self.newest = -1 # buffer of the newest complete frame
+        self.reading = -1 # buffer handed out to the reader, never written to
+        self.fresh = False # newest frame not handed out yet
+        self.captured = 0
+        self.dropped = 0
+        self.finished = False # source ran out of frames
+        self.running = True
+        self.period = 1/fps if fps else 0
+        self.cond = threading.Condition()
+        self.thread = threading.Thread(target = self.run, daemon = True)
+        self.thread.start()
+
+    def run(self):
+        next_time = time.perf_counter()
+        while self.running:
+            with self.cond:
+                # any buffer that is neither the newest nor being read
+                write = next(i for i in range(len(self.frames)) if i != self.newest and i != self.reading)
+            if not self.source.read(self.frames[write]):
+                break
+            with self.cond:
+                if self.fresh:
+                    self.dropped += 1 # never read, replaced by this one
+                self.newest = write
+                self.fresh = True
+                self.captured += 1
+                self.cond.notify_all()
+            if self.period:
+                next_time += self.period
+                time.sleep(max(0, next_time - time.perf_counter()))
+        with self.cond:
+            self.finished = True
+            self.cond.notify_all()
+
+    def read(self, timeout = None):
+        # Latest frame, waiting up to timeout seconds (None = forever) for a new one
+        # Returns (False, None) if there is no new frame. The frame stays valid
+        # until the next call to read.
+        with self.cond:
+            self.cond.wait_for(lambda: self.fresh or self.finished, timeout)
+            if not self.fresh:
+                return False, None
+            self.reading = self.newest
+            self.fresh = False
+            return True, self.frames[self.reading]
+
+    def stop(self):
+        self.running = False
+        self.thread.join(timeout = 1)
+
+
+def synthetic_frames(w = 640, h = 480, n_blobs = 3, n_frames = None, speed = 30, seed = 0):
+    # Generates noisy grayscale frames with bright blobs (hands) bouncing around,
+    # to drive the game without a camera
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[:h, :w]
+    pos = rng.uniform([50, 50], [w - 50, h - 50], (n_blobs, 2))
+    vel = rng.uniform(-speed, speed, (n_blobs, 2)) # pixels per frame
+    frame = np.empty((h, w), dtype = np.uint8)
+    noise = rng.integers(95, 105, (8, h, w), dtype = np.uint8) # cycled, cheaper than new noise
+    i = 0
+    while n_frames is None or i < n_frames:
+        frame[:] = noise[i % len(noise)]
+        for cx, cy in pos:
+            frame[(x - cx)**2 + (y - cy)**2 < 40**2] = 200
+        pos += vel
+        vel[(pos[:, 0] < 40) | (pos[:, 0] > w - 40), 0] *= -1
+        vel[(pos[:, 1] < 40) | (pos[:, 1] > h - 40), 1] *= -1
+        i += 1
+        yield frame
@@ -0,0 +1,53 @@
+import numpy as np
+import cv2
+
+
+class DistanceField(object):
+    def __init__(self, mask_size = 5):
+        # Signed distance to the edge of the motion mask, and its gradient, so
+        # "how far is the ball from motion" and "which way is out" are O(1)
+        # lookups instead of a search through contours.
+        # Distance is positive outside motion and negative inside it; the
+        # gradient points away from motion, i.e. along the surface normal
+        # mask_size: distanceTransform mask, 3, 5 or cv2.DIST_MASK_PRECISE
+        self.mask_size = mask_size
+        self.shape = None
+        self.scale = 1
+
+    def allocate(self, shape):
+        # Buffers for masks of shape (height, width)
+        self.shape = shape
+        self.inverted = np.empty(shape, dtype = np.uint8)
+        self.outside = np.empty(shape, dtype = np.float32)
+        self.inside = np.empty(shape, dtype = np.float32)
+        self.distance = np.empty(shape, dtype = np.float32)
+        self.gx = np.empty(shape, dtype = np.float32)
+        self.gy = np.empty(shape, dtype = np.float32)
+
+    def update(self, mask, scale = 1):
+        # Rebuild the field from a 0/255 motion mask, once per frame
+        # scale: mask pixels per frame pixel are 1/scale (see MotionDetector.scale)
+        if mask.shape != self.shape:
+            self.allocate(mask.shape)
+        self.scale = scale
+        cv2.bitwise_not(mask, dst = self.inverted)
+        # distanceTransform: distance of every nonzero pixel to the nearest zero pixel
+        cv2.distanceTransform(self.inverted, cv2.DIST_L2, self.mask_size, dst = self.outside)
+        cv2.distanceTransform(mask, cv2.DIST_L2, self.mask_size, dst = self.inside)
+        cv2.subtract(self.outside, self.inside, dst = self.distance)
+        # without any motion, distances are FLT_MAX; keep them frame sized
+        np.minimum(self.distance, sum(self.shape), out = self.distance)
+        cv2.Sobel(self.distance, cv2.CV_32F, 1, 0, dst = self.gx, ksize = 3)
+        cv2.Sobel(self.distance, cv2.CV_32F, 0, 1, dst = self.gy, ksize = 3)
+
+    def lookup(self, pos):
+        # Distance (frame pixels) and unit surface normal at frame positions pos
+        # pos is (x, y) or an array of them; the normal is 0 where the field is flat
+        pos = np.asarray(pos, dtype = float)
+        x = np.clip(np.rint((pos[..., 0] + 0.5)/self.scale - 0.5), 0, self.shape[1] - 1).astype(int)
+        y = np.clip(np.rint((pos[..., 1] + 0.5)/self.scale - 0.5), 0, self.shape[0] - 1).astype(int)
+        distance = self.distance[y, x]*self.scale
+        normal = np.stack((self.gx[y, x], self.gy[y, x]), axis = -1)
+        norm = np.linalg.norm(normal, axis = -1, keepdims = True)
+        normal = np.divide(normal, norm, out = np.zeros_like(normal), where = norm > 0)
+        return distance, normal
@@ -0,0 +1,66 @@
+import numpy as np
+import cv2
+
+FILTERS = ('median', 'box', 'none')
+
+
+class MotionDetector(object):
+    def __init__(self, thresh = 10, scale = 1, filter = 'median', ksize = 53):
+        # Finds where two grayscale frames differ, as a 0/255 mask
+        # thresh: smallest (filtered) change that counts as motion
+        # scale: integer downscaling before filtering, e.g. 2 filters a quarter of the pixels
+        # filter: 'median' (robust), 'box' (separable mean, much cheaper) or 'none'
+        # ksize: filter size in full resolution pixels
+        # All intermediate images are kept in buffers that are reused for every frame
+        if filter not in FILTERS:
+            raise ValueError('Unknown filter %s, use one of %s' %(filter, FILTERS))
+        self.thresh = thresh
+        self.scale = max(int(scale), 1)
+        self.filter = filter
+        ksize = int(round(ksize/self.scale)) # same extent at the lower resolution
+        self.ksize = max(ksize + 1 - ksize % 2, 3) # odd, as medianBlur needs
+        self.shape = None
+
+    def allocate(self, shape):
+        # Buffers for frames of shape (height, width)
+        h, w = shape
+        self.shape = shape
+        self.small_shape = (h//self.scale, w//self.scale)
+        self.diff = np.empty(shape, dtype = np.uint8)
+        self.small = np.empty(self.small_shape, dtype = np.uint8) if self.scale > 1 else self.diff
+        self.filtered = np.empty(self.small_shape, dtype = np.uint8)
+        self.mask = np.empty(self.small_shape, dtype = np.uint8) # at the working resolution
+        self.full_mask = np.empty(shape, dtype = np.uint8) if self.scale > 1 else self.mask
+
+    def detect(self, img, previmg, full = True):
+        # Motion mask of img relative to previmg (uint8, same shape)
+        # full: mask at full resolution, otherwise at the working resolution
+        # (use to_full to map coordinates found there back to the frame)
+        if img.shape != self.shape:
+            self.allocate(img.shape)
+        cv2.absdiff(img, previmg, dst = self.diff) # uint8, no wrap around
+        if self.scale > 1:
+            cv2.resize(self.diff, self.small_shape[::-1], dst = self.small,
+                       interpolation = cv2.INTER_AREA)
+        if self.filter == 'median':
+            cv2.medianBlur(self.small, self.ksize, dst = self.filtered)
+        elif self.filter == 'box':
+            cv2.blur(self.small, (self.ksize, self.ksize), dst = self.filtered)
+        else:
+            np.copyto(self.filtered, self.small)
+        # change >= thresh becomes 255, the rest 0
+        cv2.threshold(self.filtered, self.thresh - 1, 255, cv2.THRESH_BINARY, dst = self.mask)
+        if not full:
+            return self.mask
+        if self.scale > 1:
+            cv2.resize(self.mask, self.shape[::-1], dst = self.full_mask,
+                       interpolation = cv2.INTER_NEAREST)
+        return self.full_mask
+
+    def to_full(self, coords):
+        # Pixel coordinates at the working resolution -> full resolution (pixel centres)
+        return (np.asarray(coords) + 0.5)*self.scale - 0.5
+
+    def to_small(self, coords):
+        # Full resolution pixel coordinates -> working resolution
+        return (np.asarray(coords) + 0.5)/self.scale - 0.5
@@ -2,132 +2,142 @@ import numpy as np
 import cv2
 import PIL.Image, PIL.ImageTk
 import tkinter as tk
-from scipy import ndimage
+import os
+import sys
+import argparse
+import time
+from capture import FrameSource, FrameGrabber, synthetic_frames
+from motion import MotionDetector, FILTERS
+from distance_field import DistanceField
+from balls import spawn
+# frame timings are shared with asteroid_rage, see asteroid_rage/profiler.py
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'asteroid_rage'))
+from profiler import FrameProfiler
+
+SYNTHETIC_FRAMES = 1000 # frames in a headless run of the synthetic source, unless --frames
 
 
 class Screen(object):
-    def __init__(self, x = 680, y = 480, source = 0):
+    def __init__(self, x = 680, y = 480, source = 0, threaded = True):
+        # source: camera number, video file, or iterable of frames (see capture.synthetic_frames)
+        # threaded: capture in a background thread, keeping only the latest frame;
+        # otherwise every frame is read (and waited for) in get_cam_frame
         self.source = source
-        self.cam = cv2.VideoCapture(source)
+        self.capture = FrameSource(source, x, y)
         self.x = x
         self.y = y
-
-        if not self.cam.isOpened():
-            raise ValueError('Cannot open camera!')
-
-        self.cam.set(cv2.CAP_PROP_FRAME_WIDTH, self.x);
-        self.cam.set(cv2.CAP_PROP_FRAME_HEIGHT, self.y);
-        self.width = self.cam.get(cv2.CAP_PROP_FRAME_WIDTH)
-        self.height = self.cam.get(cv2.CAP_PROP_FRAME_HEIGHT)
+        self.width = self.capture.width
+        self.height = self.capture.height
         print('Camera Resolution:', self.width, 'x', self.height)
+        self.frame = np.zeros((self.height, self.width), dtype = np.uint8) # unthreaded buffer
+        # video files play in real time, cameras and generators as fast as they deliver
+        self.grabber = FrameGrabber(self.capture, fps = self.capture.fps) if threaded else None
+
+    @property
+    def dropped(self):
+        # frames captured but never used
+        return self.grabber.dropped if self.grabber else 0
 
     def terminator(self):
-        self.cam.release()
+        if self.grabber:
+            self.grabber.stop()
+        self.capture.release()
 
-    def get_cam_frame(self):
-        if self.cam.isOpened():
-            ret, frame = self.cam.read() # ret is int
-        return (ret, cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)) # Return ret for safety
+    def get_cam_frame(self, timeout = None):
+        # Latest grayscale frame, waits up to timeout seconds for a new one (threaded only)
+        # The frame is reused for later frames, copy it to keep it
+        if self.grabber:
+            return self.grabber.read(timeout)
+        return self.capture.read(self.frame), self.frame # Return ret for safety
 
 class VelPong(object):
-    def __init__(self, master, viewer, ball, thresh, w, h):
+    def __init__(self, master, viewer, balls, thresh, w, h, motion = None, debug = False):
+        # master: Tk root, or None to run without a window (see run_headless)
+        # balls: balls.Balls, any number of them
+        # motion: MotionDetector finding change between frames, by default full resolution median filter
+        # debug: draw the contours of the motion mask
         self.master = master
         self.viewer = viewer
-        self.ball = ball
+        self.balls = balls
         self.thresh = thresh
+        self.motion = motion if motion else MotionDetector(thresh)
+        self.field = DistanceField() # distance to motion, rebuilt every frame
         self.w = w
         self.h = h
         self.score = np.zeros(2).astype(int)
+        self.debug = debug
+        self.timer = FrameProfiler() # time per stage of the game loop
         # Init screen/ label
         success, initframe = self.viewer.get_cam_frame()
         if success:
-            self.previmg = initframe
-            initframe = PIL.Image.fromarray(initframe)
-            initframe = PIL.ImageTk.PhotoImage(initframe)
-            self.imglab = tk.Label(image = initframe)
-            self.imglab.image = initframe
-            self.imglab.pack()
+            self.previmg = initframe.copy() # frames from the viewer get overwritten
+            self.allocate_display(initframe.shape)
+        if master is None:
+            return # no window
+        # one PhotoImage, which every frame is pasted into
+        self.photo = PIL.ImageTk.PhotoImage(self.image)
+        self.imglab = tk.Label(image = self.photo)
+        self.imglab.pack()
         self.stop = tk.Button(self.master, text = 'Stop', command = self.stop)
         self.stop.pack()
         # Update screen
         self.update()
         self.master.mainloop()
 
+    def allocate_display(self, shape):
+        # Buffers for the displayed image, reused every frame
+        h, w = shape
+        # RGBA, as PIL can only share memory with 4 byte pixels
+        self.canvas = np.zeros((h, w, 4), dtype = np.uint8) # drawn on
+        self.display = np.zeros((h, w, 4), dtype = np.uint8) # mirrored canvas
+        # shares memory with display, so it never needs rebuilding
+        self.image = PIL.Image.frombuffer('RGBA', (w, h), self.display, 'raw', 'RGBA', 0, 1)
+
     def update(self):
-        success, frame = self.viewer.get_cam_frame() # success if camera can aquire frame
+        self.timer.start()
+        success, frame = self.viewer.get_cam_frame(timeout = 0) # success if a new frame is ready
 
         if success:
-            gameframe = self.frame_change(frame) # Find change in image
-            self.ball.position()  # Update ball position
-            if self.ball.pos[0] <= 1:
-                self.ball.v[0] = -self.ball.v[0]
-                self.ball.pos[0] = 1
-                self.score[0] = self.score[0] + 1
-                print('Player 1:', self.score[0])
-                print('Player 2:', self.score[1], '\n')
+            self.timer.lap('capture')
+            self.step(frame)
+            self.draw()
+            self.photo.paste(self.image) # Label image
+            self.timer.lap('display')
 
-            if self.ball.pos[0] >= self.w - 1:
-                self.ball.v[0] = -self.ball.v[0]
-                self.ball.pos[0] = self.w - 1
-                self.score[1] = self.score[1] + 1
+        self.master.after(1, self.update) # Update GUI
+
+    def step(self, frame):
+        # Game logic for a new frame: motion, then balls
+        gameframe = self.frame_change(frame) # Find change in image
+        np.copyto(self.previmg, frame)  # Set previous frame, for finding change
+        self.timer.lap('mask')
+        self.field.update(self.motion.mask, self.motion.scale) # once per frame
+        self.timer.lap('field')
+        goals = self.balls.step(self.field) # Update ball positions, bounce off motion and walls
+        if np.any(goals):
+            self.score += goals
+            if self.master is not None:
                 print('Player 1:', self.score[0])
                 print('Player 2:', self.score[1], '\n')
-
-            if self.ball.pos[1] <= 1:
-                self.ball.v[1] = -self.ball.v[1]
-                self.ball.pos[1] = 1
-
-            if self.ball.pos[1] >= self.h - 1:
-                self.ball.v[1] = -self.ball.v[1]
-                self.ball.pos[1] = self.h - 1
-            self.previmg = frame  # Set previous frame, for finding change
-
-            x = int(self.ball.pos[0])
-            y = int(self.ball.pos[1]) # Quantum ball
-
-            gameframe, contours  = self.find_contours(gameframe, self.ball.pos)
-            if np.array_equal(gameframe[y, x], [255, 0, 0]) or np.array_equal(gameframe[y, x], [255, 255, 255]):
-                contour, ind = self.closest_contour(contours, self.ball.pos)
-                #np.save('contourtest.npy', contour) # For testing contours and normal vectors
-                xx = contour[:,0,0]
-                yy = contour[:,0,1]
-                u = np.zeros((len(xx), 3))
-                try:
-                    # Find normal vector of surface at collision
-                    u[:,0] = np.gradient(xx)
-                    u[:,1] = np.gradient(yy)
-                    u[:, 2] = 1
-                    z = np.array([0, 0, 1])
-                    uu = u[:, 0]
-                    v = np.cross(u, z)[:, :2] # Keep only x, y, gives normal vector to contour
-                    normal  = -v[ind]
-                    norm = np.linalg.norm(normal)
-                    if norm == 0:
-                        self.ball.v = -self.ball.v
-                    else:
-                        dir = normal/norm
-                        self.ball.v = np.linalg.norm(self.ball.v)*dir#*2 # Change only ball direction
-                        self.ball.pos = np.array([contour[ind, 0, 0], contour[ind, 0, 1]]) + dir # Teleport ball to safety
-                except:
-                    print('I made a boboo') # Oops
-                    normal = -self.ball.v # Better to just fling it off
-            #gameframe = frame # Regular camera view
-            cv2.circle(gameframe,(x, y), 10, (0, 212, 49), -1) # Draw ball
-            photo = PIL.ImageTk.PhotoImage(image = PIL.Image.fromarray(cv2.flip(gameframe,1)))
-            self.imglab.configure(image = photo)
-            self.imglab.image = photo # Label image
-
-        self.master.after(1, self.update) # Update GUI
+        self.timer.lap('balls')
+
+    def draw(self):
+        # Draw the motion mask and balls, mirrored, into self.display (and self.image)
+        mask = self.motion.full_mask
+        cv2.cvtColor(mask, cv2.COLOR_GRAY2RGBA, dst = self.canvas)
+        #self.canvas = frame # Regular camera view
+        if self.debug:
+            contours, hier = cv2.findContours(mask, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
+            cv2.drawContours(self.canvas, contours, -1, (255, 0, 0, 255), 12)
+        for x, y in self.balls.pos.astype(int): # Quantum balls
+            cv2.circle(self.canvas, (x, y), 10, (0, 212, 49, 255), -1) # Draw ball
+        cv2.flip(self.canvas, 1, dst = self.display)
+        self.timer.lap('draw')
 
     def frame_change(self, img):
-        # Convert as inefficiently as possible
-        img = np.int8(img)
-        previmg = np.int8(self.previmg)
-        change = np.abs(img - previmg)
-        change = cv2.medianBlur(np.uint8(change),53)
-        change[change < self.thresh] = 0
-        change[change >= self.thresh] = 255
-        return change
+        # Mask of where img changed since the previous frame (255), see motion.MotionDetector
+        # The mask is reused for the next frame
+        return self.motion.detect(img, self.previmg)
 
     def find_contours(self, img, pos):
         # Finds contours, uses simple contour approximation to save space
@@ -150,25 +160,61 @@ class VelPong(object):
         return closest_contour, closest
 
     def stop(self):
+        print('Dropped frames:', self.viewer.dropped)
+        print(self.timer.report())
         self.viewer.terminator()
         self.master.destroy()
 
-class Ball(object):
-    def __init__(self, pos, v0, dt):
-        self.dt = dt
-        self.v = v0
-        self.pos = pos
-
-    def position(self):
-        # Updates ball position
-        self.v = self.v#*0.92 + np.array([0, 1300])
-        self.pos =  self.pos + self.v*self.dt
+def run_headless(viewer, balls, motion, max_frames = None, draw = True):
+    # Runs the game loop (capture, mask, collision, balls, drawing) without a window,
+    # on every frame of viewer (e.g. an unthreaded Screen of a video file)
+    # Returns the game and end-to-end frames per second
+    game = VelPong(None, viewer, balls, motion.thresh, viewer.width, viewer.height, motion)
+    frames = 0
+    t0 = time.perf_counter()
+    while max_frames is None or frames < max_frames:
+        game.timer.start()
+        success, frame = viewer.get_cam_frame()
+        if not success:
+            break
+        game.timer.lap('capture')
+        game.step(frame)
+        if draw:
+            game.draw()
+        frames += 1
+    wall = time.perf_counter() - t0
+    viewer.terminator()
+    return game, frames/wall
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Velocity pong')
+    parser.add_argument('--source', default = '0', help = "camera number, video file, or 'synthetic'")
+    parser.add_argument('--scale', type = int, default = 1, help = 'downscale frames by this before filtering')
+    parser.add_argument('--filter', default = 'median', choices = FILTERS, help = 'motion mask filter')
+    parser.add_argument('--balls', type = int, default = 1, help = 'number of balls')
+    parser.add_argument('--debug', action = 'store_true', help = 'draw contours of the motion')
+    parser.add_argument('--headless', action = 'store_true',
+                        help = 'no window: run every frame of the source as fast as possible, and report timings')
+    parser.add_argument('--frames', type = int, default = None,
+                        help = 'stop after this many frames (headless, default %d for synthetic)' %SYNTHETIC_FRAMES)
+    args = parser.parse_args()
     w = 640; h = 480
-    screen = Screen(w, h, source = 0)
-    master = tk.Tk()
-    x0 = np.array([int(w/2), int(h/2)])
+    if args.source == 'synthetic':
+        if args.headless and args.frames is None:
+            args.frames = SYNTHETIC_FRAMES # the source never ends by itself
+        source = synthetic_frames(w, h, n_frames = args.frames if args.headless else None)
+    else:
+        source = int(args.source) if args.source.isdigit() else args.source
+    screen = Screen(w, h, source = source, threaded = not args.headless)
     v0 = np.array([-1, 2])*10000
-    ball = Ball(x0, v0, dt = 0.001)
-    viewer = VelPong(master, screen, ball, thresh = 10, w = w, h = h)
+    balls = spawn(args.balls, screen.width, screen.height, speed = np.linalg.norm(v0), dt = 0.001) # from the centre
+    balls.v[0] = v0 # the first ball serves as always
+    motion = MotionDetector(thresh = 10, scale = args.scale, filter = args.filter)
+    if args.headless:
+        game, fps = run_headless(screen, balls, motion, args.frames)
+        print('%d frames: %.1f FPS, score %d - %d' %(game.timer.count['capture'], fps, *game.score))
+        print(game.timer.report())
+    else:
+        master = tk.Tk()
+        viewer = VelPong(master, screen, balls, thresh = 10, w = w, h = h, motion = motion,
+                         debug = args.debug)